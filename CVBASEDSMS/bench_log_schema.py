@@ -0,0 +1,112 @@
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from logic import history
+from logic.history import read_csv_part, write_day
+from logic.logger import LOG_HEADER
+
+
+def _legacy_frame(rows, rng):
+    base = pd.Timestamp("2026-01-01")
+    offsets = pd.to_timedelta(np.sort(rng.integers(0, 86400 * 60, rows)), unit="s")
+    timestamps = base + offsets
+    # The real file mixes both layouts; keep roughly its ratio.
+    dayfirst = rng.random(rows) < 0.12
+    text = np.where(
+        dayfirst,
+        timestamps.strftime("%d-%m-%Y %H:%M"),
+        timestamps.strftime("%Y-%m-%d %H:%M:%S"),
+    )
+    return pd.DataFrame(
+        {
+            "timestamp": text,
+            "camera_id": rng.choice(["CAM_STREAM", "CAM_VIDEO", "CAM_DEMO"], rows),
+            "violations": rng.choice(["NO_HARNESS", "NO_HELMET, NO_HARNESS", "NO_HELMET"], rows),
+            "severity": rng.choice(["CRITICAL", "WARNING"], rows),
+        }
+    )
+
+
+def _normalized_frame(rows, rng):
+    base = pd.Timestamp("2026-01-01", tz="UTC")
+    offsets = pd.to_timedelta(np.sort(rng.integers(0, 86400 * 60, rows)), unit="s")
+    boxes = rng.integers(0, 1280, (rows, 4))
+    return pd.DataFrame(
+        {
+            "timestamp": (base + offsets).strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+            "camera_id": rng.choice(["CAM_STREAM", "CAM_VIDEO", "CAM_DEMO"], rows),
+            "event_id": "NO_HARNESS:SAFE:10:12",
+            "violation": rng.choice(["NO_HARNESS", "NO_HELMET"], rows),
+            "severity": rng.choice(["CRITICAL", "WARNING"], rows),
+            "zone": rng.choice(["SAFE", "HIGH_RISK"], rows),
+            "bbox_x1": boxes[:, 0],
+            "bbox_y1": boxes[:, 1],
+            "bbox_x2": boxes[:, 2],
+            "bbox_y2": boxes[:, 3],
+            "clip": "",
+            "frame_id": np.arange(rows),
+            "capture_to_log_ms": rng.integers(50, 2000, rows),
+        }
+    )[LOG_HEADER]
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def _legacy_reader(path):
+    # The reader dashboard.load_violations used before the schema change.
+    df = pd.read_csv(path)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce", dayfirst=True)
+    return df.dropna(subset=["timestamp"])
+
+
+def _report(name, df, seconds, filter_seconds):
+    mb = df.memory_usage(deep=True).sum() / 1e6
+    print(
+        f"{name:<22} parse {seconds:7.2f}s  rows {len(df):>9}  "
+        f"memory {mb:8.1f} MB  severity filter {filter_seconds * 1000:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark violation log parsing")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        legacy_path = tmp / "legacy.csv"
+        normalized_path = tmp / "normalized.csv"
+        _legacy_frame(args.rows, rng).to_csv(legacy_path, index=False)
+        _normalized_frame(args.rows, rng).to_csv(normalized_path, index=False)
+
+        df, seconds = _timed(lambda: _legacy_reader(legacy_path))
+        _, filter_seconds = _timed(
+            lambda: df[df["severity"].astype(str).str.upper().str.contains("CRITICAL")]
+        )
+        _report("legacy csv", df, seconds, filter_seconds)
+
+        df, seconds = _timed(lambda: read_csv_part(normalized_path))
+        _, filter_seconds = _timed(lambda: df[df["severity"] == "CRITICAL"])
+        _report("normalized csv", df, seconds, filter_seconds)
+
+        # write_day targets LOG_DIR; point it at the scratch directory.
+        history.LOG_DIR = tmp
+        parquet_path = write_day(pd.Timestamp("2026-01-01").date(), df)
+        entry = {"csv": [], "parquet": parquet_path}
+        df, seconds = _timed(lambda: history.read_day(entry))
+        _, filter_seconds = _timed(lambda: df[df["severity"] == "CRITICAL"])
+        _report("normalized parquet", df, seconds, filter_seconds)
+
+
+if __name__ == "__main__":
+    main()
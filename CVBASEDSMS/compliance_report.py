@@ -0,0 +1,50 @@
+import argparse
+
+from logic.history import CHUNK_ROWS
+from logic.report import LOG_ROOT, PERIODS, REPORT_FILE, SHIFTS, TOP_N, parse_shifts, run_report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Per-shift, per-day or per-week compliance summaries from the violation "
+        "logs, streamed in fixed-size chunks"
+    )
+    parser.add_argument(
+        "--log_dir",
+        action="append",
+        default=None,
+        help="Log root holding history/ and violations.csv (repeatable; default: logs/)",
+    )
+    parser.add_argument("--report", type=str, default=str(REPORT_FILE))
+    parser.add_argument("--period", choices=PERIODS, default="shift")
+    parser.add_argument(
+        "--shifts",
+        type=parse_shifts,
+        default=SHIFTS,
+        help="Shift start hours, e.g. day=6,evening=14,night=22",
+    )
+    parser.add_argument("--start", type=str, default=None, help="e.g. 2026-10-01")
+    parser.add_argument(
+        "--end", type=str, default=None, help="Inclusive; a bare date covers that whole day"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk_rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--top", type=int, default=TOP_N)
+    args = parser.parse_args()
+    raise SystemExit(
+        run_report(
+            args.log_dir or [LOG_ROOT],
+            args.report,
+            period=args.period,
+            shifts=args.shifts,
+            start=args.start,
+            end=args.end,
+            workers=args.workers,
+            chunk_rows=args.chunk_rows,
+            top=args.top,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
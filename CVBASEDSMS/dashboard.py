@@ -1,22 +1,25 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
-import time
 
 import cv2
 import pandas as pd
 import streamlit as st
 
+from logic.events import mark_events_logged, update_event_state
+from logic.history import query_violations, source_files
 from logic.logger import log_violation
-from logic.pipeline import process_frame
+from logic.pipeline import analyze_frame, render_frame, violation_evidence
 
 
 BASE_DIR = Path(__file__).resolve().parent
-LOG_PATH = BASE_DIR / "logs" / "violations.csv"
 VIDEO_PATH = BASE_DIR / "videos" / "test.mp4"
 CAMERA_ID = "CAM_DASHBOARD"
-EVENT_CONFIRM_FRAMES = 5
-EVENT_COOLDOWN_SECONDS = 8
-EVENT_FORGET_FRAMES = 45
+# Each part of the page reruns on its own timer instead of the whole
+# script; filters and styles only run again when the user changes them.
+FEED_FPS = 15
+STATUS_REFRESH_SECONDS = 1
+KPI_REFRESH_SECONDS = 5
+INCIDENT_POLL_SECONDS = 2
 
 
 st.set_page_config(page_title="KRUU Safety Monitor", layout="wide")
@@ -187,15 +190,66 @@ html, body, [class*="css"] {
 )
 
 
-def load_violations():
-    if not LOG_PATH.exists():
-        return pd.DataFrame(columns=["timestamp", "camera_id", "violations", "severity"])
-    df = pd.read_csv(LOG_PATH)
-    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce", dayfirst=True)
-    df = df.dropna(subset=["timestamp"])
+RANGE_WINDOWS = {
+    "Last 15 min": pd.Timedelta(minutes=15),
+    "Last 1 hour": pd.Timedelta(hours=1),
+    "Last 24 hours": pd.Timedelta(hours=24),
+}
+SEVERITY_CHIPS = {
+    "CRITICAL": '<span class="chip chip-critical">CRITICAL</span>',
+    "WARNING": '<span class="chip chip-warning">WARNING</span>',
+}
+INFO_CHIP = '<span class="chip chip-info">INFO</span>'
+
+
+def log_fingerprint(start=None):
+    """
+    Names, mtimes and sizes of the log files a query from start reads;
+    it only changes when events are written
+    """
+    fingerprint = []
+    for path in source_files(start=start):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        fingerprint.append((str(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(fingerprint)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _load_violations(start, fingerprint):
+    return query_violations(start=start)
+
+
+def range_start(range_choice):
+    """
+    Start of the selected range floored to the minute, so cache keys stay
+    put between refreshes
+    """
+    window = RANGE_WINDOWS.get(range_choice)
+    if window is None:
+        return None
+    return (pd.Timestamp.now() - window).floor("min")
+
+
+def load_violations(range_choice, camera_choice="All", severity_choice="All"):
+    """
+    Returns violations in range after filters. The log is only read
+    again when its fingerprint changes.
+    """
+    start = range_start(range_choice)
+    df = _load_violations(start, log_fingerprint(start))
+    window = RANGE_WINDOWS.get(range_choice)
+    if window is not None:
+        df = df[df["timestamp"] >= pd.Timestamp.now() - window]
+    if camera_choice != "All":
+        df = df[df["camera_id"] == camera_choice]
+    if severity_choice != "All":
+        df = df[df["severity"] == severity_choice]
     return df
 
-def log_confirmed_events(all_violations, alert):
+def log_confirmed_events(all_violations, evidence):
     if "event_state" not in st.session_state:
         st.session_state.event_state = {}
     st.session_state.frame_index = st.session_state.get("frame_index", 0) + 1
@@ -203,37 +257,9 @@ def log_confirmed_events(all_violations, alert):
     event_state = st.session_state.event_state
     frame_index = st.session_state.frame_index
     now = datetime.now()
-    current_event_ids = {v[3] for v in all_violations}
-
-    for event_id in current_event_ids:
-        state_item = event_state.get(
-            event_id, {"count": 0, "last_seen_frame": -1, "last_logged_at": None}
-        )
-        if state_item["last_seen_frame"] == frame_index - 1:
-            state_item["count"] += 1
-        else:
-            state_item["count"] = 1
-        state_item["last_seen_frame"] = frame_index
-        event_state[event_id] = state_item
-
-    stale_ids = [
-        event_id
-        for event_id, state_item in event_state.items()
-        if frame_index - state_item["last_seen_frame"] > EVENT_FORGET_FRAMES
-    ]
-    for event_id in stale_ids:
-        del event_state[event_id]
-
-    events_to_log = []
-    for event_id in current_event_ids:
-        state_item = event_state[event_id]
-        cooldown_done = (
-            state_item["last_logged_at"] is None
-            or (now - state_item["last_logged_at"]) >= timedelta(seconds=EVENT_COOLDOWN_SECONDS)
-        )
-        if state_item["count"] >= EVENT_CONFIRM_FRAMES and cooldown_done:
-            events_to_log.append(event_id)
-
+    events_to_log = update_event_state(
+        event_state, all_violations, frame_index, now, evidence=evidence
+    )
     if not events_to_log:
         return
 
@@ -244,10 +270,8 @@ def log_confirmed_events(all_violations, alert):
     log_violation(
         camera_id=CAMERA_ID,
         violations=violations_to_log,
-        severity=alert,
     )
-    for event_id in events_to_log:
-        event_state[event_id]["last_logged_at"] = now
+    mark_events_logged(event_state, events_to_log, now)
 
 
 def badge_for_alert(alert):
@@ -261,10 +285,10 @@ def badge_for_alert(alert):
 def chip_for_severity(sev):
     s = str(sev).upper()
     if "CRITICAL" in s:
-        return '<span class="chip chip-critical">CRITICAL</span>'
+        return SEVERITY_CHIPS["CRITICAL"]
     if "WARNING" in s:
-        return '<span class="chip chip-warning">WARNING</span>'
-    return '<span class="chip chip-info">INFO</span>'
+        return SEVERITY_CHIPS["WARNING"]
+    return INFO_CHIP
 
 
 def kpi_card(title, value):
@@ -279,56 +303,32 @@ def kpi_card(title, value):
     )
 
 
-filters = st.columns([1.2, 1.2, 1.2, 2.4])
-df_all = load_violations()
-
-with filters[0]:
-    camera_options = ["All"] + sorted(df_all["camera_id"].dropna().unique().tolist())
-    camera_choice = st.selectbox("Camera", camera_options)
-with filters[1]:
-    severity_choice = st.selectbox("Severity", ["All", "CRITICAL", "WARNING", "INFO"])
-with filters[2]:
-    range_choice = st.selectbox("Time Range", ["Last 15 min", "Last 1 hour", "Last 24 hours", "All"])
-with filters[3]:
-    st.markdown(
-        '<div class="subtitle" style="padding-top: 18px;">Filters update the metrics and incidents table</div>',
-        unsafe_allow_html=True,
+def incidents_table_html(df):
+    recent = df.nlargest(10, "timestamp")
+    timestamps = recent["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    chips = recent["severity"].astype(str).map(chip_for_severity)
+    rows_html = [
+        f"<tr><td>{ts}</td><td>{camera}</td><td>{violation}</td><td>{chip}</td></tr>"
+        for ts, camera, violation, chip in zip(
+            timestamps, recent["camera_id"].astype(str), recent["violation"].astype(str), chips
+        )
+    ]
+    return (
+        '<div class="card"><table class="table">'
+        "<thead><tr><th>Timestamp</th><th>Camera</th><th>Violation</th><th>Severity</th></tr></thead>"
+        "<tbody>"
+        + "".join(rows_html)
+        + "</tbody></table></div>"
     )
 
-df = df_all.copy()
-now = pd.Timestamp.now()
-if range_choice == "Last 15 min":
-    df = df[df["timestamp"] >= now - pd.Timedelta(minutes=15)]
-elif range_choice == "Last 1 hour":
-    df = df[df["timestamp"] >= now - pd.Timedelta(hours=1)]
-elif range_choice == "Last 24 hours":
-    df = df[df["timestamp"] >= now - pd.Timedelta(hours=24)]
-
-if camera_choice != "All":
-    df = df[df["camera_id"] == camera_choice]
-if severity_choice != "All":
-    df = df[df["severity"].astype(str).str.upper().str.contains(severity_choice)]
-
-
-if "cap" not in st.session_state:
-    st.session_state.cap = cv2.VideoCapture(str(VIDEO_PATH))
-cap = st.session_state.cap
-
-ret, frame = cap.read()
-if not ret:
-    st.warning("No frame received")
-    st.stop()
-
-frame, alert, all_violations = process_frame(frame)
-log_confirmed_events(all_violations, alert)
-frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
-st.markdown('<div class="page">', unsafe_allow_html=True)
-
-col_left, col_right = st.columns([3, 1.5])
-with col_left:
-    st.markdown(
-        f"""
+@st.fragment(run_every=STATUS_REFRESH_SECONDS)
+def status_bar():
+    alert = st.session_state.get("alert", "INFO")
+    col_left, col_right = st.columns([3, 1.5])
+    with col_left:
+        st.markdown(
+            f"""
 <div class="topbar">
   <div>
     <div class="title">Construction Safety Monitor</div>
@@ -337,12 +337,12 @@ with col_left:
   <div>{badge_for_alert(alert)}</div>
 </div>
 """,
-        unsafe_allow_html=True,
-    )
+            unsafe_allow_html=True,
+        )
 
-with col_right:
-    st.markdown(
-        """
+    with col_right:
+        st.markdown(
+            """
 <div class="topbar">
   <div>
     <div class="kpi-title">System</div>
@@ -354,85 +354,127 @@ with col_right:
   </div>
 </div>
 """.format(datetime.now().strftime("%H:%M:%S")),
-        unsafe_allow_html=True,
-    )
+            unsafe_allow_html=True,
+        )
 
-st.markdown("</div>", unsafe_allow_html=True)
 
+@st.fragment(run_every=KPI_REFRESH_SECONDS)
+def kpi_row(range_choice, camera_choice, severity_choice):
+    df = load_violations(range_choice, camera_choice, severity_choice)
+    metrics = st.columns(4)
+    with metrics[0]:
+        kpi_card("Incidents (filtered)", int(len(df)))
+    with metrics[1]:
+        kpi_card("Critical", int((df["severity"] == "CRITICAL").sum()))
+    with metrics[2]:
+        kpi_card("Warning", int((df["severity"] == "WARNING").sum()))
+    with metrics[3]:
+        last_ts = df["timestamp"].max() if not df.empty else None
+        kpi_card("Last Incident", last_ts.strftime("%H:%M:%S") if last_ts is not None else "None")
+
+
+@st.fragment(run_every=1.0 / FEED_FPS)
+def live_feed():
+    cap = st.session_state.cap
+    ret, frame = cap.read()
+    if not ret:
+        st.warning("No frame received")
+        return
 
-metrics = st.columns(4)
-with metrics[0]:
-    kpi_card("Incidents (filtered)", int(len(df)))
-with metrics[1]:
-    kpi_card("Critical", int(df["severity"].astype(str).str.contains("CRITICAL").sum()))
-with metrics[2]:
-    kpi_card("Warning", int(df["severity"].astype(str).str.contains("WARNING").sum()))
-with metrics[3]:
-    last_ts = df["timestamp"].max() if not df.empty else None
-    kpi_card("Last Incident", last_ts.strftime("%H:%M:%S") if last_ts is not None else "None")
+    persons, alert, all_violations = analyze_frame(frame)
+    h, w = frame.shape[:2]
+    log_confirmed_events(all_violations, violation_evidence(persons, w, h))
+    frame = render_frame(frame, persons, alert, all_violations)
+    st.session_state.alert = alert
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    main_cols = st.columns([2.2, 1])
+    with main_cols[0]:
+        st.markdown('<div class="section-title">Live Feed</div>', unsafe_allow_html=True)
+        st.image(frame_rgb, channels="RGB", output_format="JPEG", use_container_width=True)
+        st.markdown(
+            '<div class="subtitle">Green = Safe Zone, Red = High Risk Zone</div>',
+            unsafe_allow_html=True,
+        )
+    with main_cols[1]:
+        st.markdown('<div class="section-title">Current Status</div>', unsafe_allow_html=True)
+        st.markdown(
+            f'<div class="card">Alert: {badge_for_alert(alert)}</div>',
+            unsafe_allow_html=True,
+        )
+        st.markdown('<div class="section-title">Active Violations</div>', unsafe_allow_html=True)
+        if alert != "INFO":
+            rows = {}
+            for violation in all_violations:
+                sev, v, reason = violation[:3]
+                key = (v, reason)
+                rows[key] = rows.get(key, 0) + 1
+            data = []
+            for (v, reason), count in rows.items():
+                data.append({"Violation": v, "Reason": reason, "Count": count})
+            st.dataframe(pd.DataFrame(data), use_container_width=True, hide_index=True, height=220)
+        else:
+            st.markdown('<div class="card">No active violations detected.</div>', unsafe_allow_html=True)
 
 
-main_cols = st.columns([2.2, 1])
-with main_cols[0]:
-    st.markdown('<div class="section-title">Live Feed</div>', unsafe_allow_html=True)
-    st.image(frame_rgb, channels="RGB", use_container_width=True)
-    st.markdown(
-        '<div class="subtitle">Green = Safe Zone, Red = High Risk Zone</div>',
-        unsafe_allow_html=True,
-    )
-with main_cols[1]:
-    st.markdown('<div class="section-title">Current Status</div>', unsafe_allow_html=True)
+@st.fragment(run_every=KPI_REFRESH_SECONDS)
+def incident_timeline(range_choice, camera_choice, severity_choice):
+    df = load_violations(range_choice, camera_choice, severity_choice)
+    st.markdown('<div class="section-title">Incident Timeline</div>', unsafe_allow_html=True)
+    if not df.empty:
+        by_minute = df.set_index("timestamp").resample("1min").size().rename("count").to_frame()
+        st.line_chart(by_minute, height=160)
+    else:
+        st.markdown('<div class="card">No incidents in selected range.</div>', unsafe_allow_html=True)
+
+
+@st.fragment(run_every=INCIDENT_POLL_SECONDS)
+def recent_incidents(range_choice, camera_choice, severity_choice):
+    # Polls the log fingerprint (a few stat calls) and rebuilds the table
+    # only when it or the filters change.
+    start = range_start(range_choice)
+    key = (start, camera_choice, severity_choice)
+    fingerprint = log_fingerprint(start)
+    cached = st.session_state.get("incidents_html")
+    if cached is None or cached[0] != (key, fingerprint):
+        df = load_violations(range_choice, camera_choice, severity_choice)
+        html = incidents_table_html(df) if not df.empty else None
+        cached = ((key, fingerprint), html)
+        st.session_state.incidents_html = cached
+
+    st.markdown('<div class="section-title">Recent Incidents</div>', unsafe_allow_html=True)
+    if cached[1] is not None:
+        st.markdown(cached[1], unsafe_allow_html=True)
+    else:
+        st.markdown('<div class="card">No incident history available.</div>', unsafe_allow_html=True)
+
+
+filters = st.columns([1.2, 1.2, 1.2, 2.4])
+
+with filters[2]:
+    range_choice = st.selectbox("Time Range", ["Last 15 min", "Last 1 hour", "Last 24 hours", "All"])
+df = load_violations(range_choice)
+
+with filters[0]:
+    camera_options = ["All"] + sorted(df["camera_id"].dropna().unique().tolist())
+    camera_choice = st.selectbox("Camera", camera_options)
+with filters[1]:
+    severity_choice = st.selectbox("Severity", ["All", "CRITICAL", "WARNING", "INFO"])
+with filters[3]:
     st.markdown(
-        f'<div class="card">Alert: {badge_for_alert(alert)}</div>',
+        '<div class="subtitle" style="padding-top: 18px;">Filters update the metrics and incidents table</div>',
         unsafe_allow_html=True,
     )
-    st.markdown('<div class="section-title">Active Violations</div>', unsafe_allow_html=True)
-    if alert != "INFO":
-        rows = {}
-        for violation in all_violations:
-            sev, v, reason = violation[:3]
-            key = (v, reason)
-            rows[key] = rows.get(key, 0) + 1
-        data = []
-        for (v, reason), count in rows.items():
-            data.append({"Violation": v, "Reason": reason, "Count": count})
-        st.dataframe(pd.DataFrame(data), use_container_width=True, hide_index=True, height=220)
-    else:
-        st.markdown('<div class="card">No active violations detected.</div>', unsafe_allow_html=True)
-
-
-st.markdown('<div class="section-title">Incident Timeline</div>', unsafe_allow_html=True)
-if not df.empty:
-    by_minute = df.set_index("timestamp").resample("1min").size().rename("count").to_frame()
-    st.line_chart(by_minute, height=160)
-else:
-    st.markdown('<div class="card">No incidents in selected range.</div>', unsafe_allow_html=True)
-
-
-st.markdown('<div class="section-title">Recent Incidents</div>', unsafe_allow_html=True)
-if not df.empty:
-    recent = df.sort_values("timestamp", ascending=False).head(10)
-    rows_html = []
-    for _, row in recent.iterrows():
-        rows_html.append(
-            "<tr>"
-            f"<td>{row['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}</td>"
-            f"<td>{row.get('camera_id', '')}</td>"
-            f"<td>{row.get('violations', '')}</td>"
-            f"<td>{chip_for_severity(row.get('severity', 'INFO'))}</td>"
-            "</tr>"
-        )
-    table_html = (
-        '<div class="card"><table class="table">'
-        "<thead><tr><th>Timestamp</th><th>Camera</th><th>Violation</th><th>Severity</th></tr></thead>"
-        "<tbody>"
-        + "".join(rows_html)
-        + "</tbody></table></div>"
-    )
-    st.markdown(table_html, unsafe_allow_html=True)
-else:
-    st.markdown('<div class="card">No incident history available.</div>', unsafe_allow_html=True)
 
 
-time.sleep(0.03)
-st.rerun()
+if "cap" not in st.session_state:
+    st.session_state.cap = cv2.VideoCapture(str(VIDEO_PATH))
+
+st.markdown('<div class="page">', unsafe_allow_html=True)
+status_bar()
+st.markdown("</div>", unsafe_allow_html=True)
+
+kpi_row(range_choice, camera_choice, severity_choice)
+live_feed()
+incident_timeline(range_choice, camera_choice, severity_choice)
+recent_incidents(range_choice, camera_choice, severity_choice)
@@ -0,0 +1,424 @@
+import argparse
+import csv
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+LOADTEST_FILE = BASE_DIR / "logs" / "loadtest.csv"
+FIELDS = [
+    "cameras",
+    "viewers",
+    "status_clients",
+    "detector",
+    "fps_target",
+    "fps_mean",
+    "fps_min",
+    "frame_age_mean_ms",
+    "frame_age_p95_ms",
+    "viewer_fps_mean",
+    "viewer_interval_p95_ms",
+    "viewer_jitter_ms",
+    "status_p95_ms",
+    "cpu_percent",
+    "rss_mb",
+]
+BOUNDARY = b"--frame\r\n"
+_SAMPLE_RE = re.compile(r'^([a-zA-Z_:][\w:]*)(?:\{(.*)\})?\s+(\S+)$')
+_LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def _counts(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _round(value, digits=1):
+    return round(value, digits) if value is not None else None
+
+
+def fetch(url, timeout=5.0):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read()
+
+
+def parse_metrics(text):
+    """
+    Maps (name, frozenset of label pairs) to value for every sample in a
+    Prometheus text exposition
+    """
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = _SAMPLE_RE.match(line)
+        if match is None:
+            continue
+        name, labels, value = match.groups()
+        samples[(name, frozenset(_LABEL_RE.findall(labels or "")))] = float(value)
+    return samples
+
+
+def _sample(samples, name, **labels):
+    return samples.get((name, frozenset(labels.items())), 0.0)
+
+
+def _histogram_delta(before, after, name, camera):
+    """
+    Returns (count, sum, [(le, cumulative count)]) accrued between two
+    scrapes for one camera
+    """
+    buckets = []
+    for (sample, labels), value in after.items():
+        if sample != f"{name}_bucket" or ("camera", camera) not in labels:
+            continue
+        le = dict(labels)["le"]
+        bound = float("inf") if le == "+Inf" else float(le)
+        buckets.append((bound, value - before.get((sample, labels), 0.0)))
+    count = _sample(after, f"{name}_count", camera=camera) - _sample(
+        before, f"{name}_count", camera=camera
+    )
+    total = _sample(after, f"{name}_sum", camera=camera) - _sample(
+        before, f"{name}_sum", camera=camera
+    )
+    return count, total, sorted(buckets)
+
+
+def _histogram_quantile(buckets, count, q):
+    for bound, cumulative in buckets:
+        if count and cumulative >= q * count:
+            return bound
+    return None
+
+
+def process_usage(pid):
+    """
+    Returns (cpu seconds, rss bytes) for a process, or (None, None) where
+    neither psutil nor /proc is available
+    """
+    try:
+        import psutil
+
+        proc = psutil.Process(pid)
+        times = proc.cpu_times()
+        return times.user + times.system, proc.memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None, None
+    try:
+        fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        cpu = (int(fields[11]) + int(fields[12])) / ticks
+        rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+        return cpu, rss
+    except (OSError, IndexError, ValueError):
+        return None, None
+
+
+class StreamViewer(threading.Thread):
+    """
+    Reads /stream and records when each multipart frame boundary arrives
+    """
+
+    def __init__(self, url):
+        super().__init__(daemon=True)
+        self.url = url
+        self.arrivals = []
+        self.stop_event = threading.Event()
+
+    def run(self):
+        try:
+            with urllib.request.urlopen(self.url, timeout=10.0) as response:
+                tail = b""
+                while not self.stop_event.is_set():
+                    chunk = response.read1(65536)
+                    if not chunk:
+                        return
+                    data = tail + chunk
+                    now = time.monotonic()
+                    self.arrivals.extend([now] * data.count(BOUNDARY))
+                    tail = data[-(len(BOUNDARY) - 1):]
+        except OSError:
+            return
+
+    def intervals(self, since):
+        arrivals = [t for t in self.arrivals if t >= since]
+        return [b - a for a, b in zip(arrivals, arrivals[1:])]
+
+
+class StatusPoller(threading.Thread):
+    def __init__(self, url, interval=1.0):
+        super().__init__(daemon=True)
+        self.url = url
+        self.interval = interval
+        self.latencies = []
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            started = time.monotonic()
+            try:
+                fetch(self.url)
+            except OSError:
+                continue
+            self.latencies.append((started, time.monotonic() - started))
+
+
+def start_feeders(count, args, log):
+    """
+    Publishes the test video to rtsp_base/simN with ffmpeg; an RTSP
+    server (e.g. mediamtx) must already be listening there
+    """
+    if shutil.which("ffmpeg") is None:
+        raise RuntimeError("ffmpeg is required for --rtsp_base")
+    feeders = []
+    for index in range(count):
+        cmd = [
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-re", "-stream_loop", "-1",
+            "-i", args.video_path, "-c", "copy", "-f", "rtsp", f"{args.rtsp_base}/sim{index}",
+        ]
+        feeders.append(subprocess.Popen(cmd, stdout=log, stderr=log))
+    return feeders
+
+
+def start_server(index, args, log_dir, log):
+    port = args.base_port + index
+    cmd = [
+        sys.executable,
+        str(BASE_DIR / "stream_server.py"),
+        "--port", str(port),
+        "--camera_id", f"SIM_{index}",
+        "--fps", str(args.fps),
+        "--detector", args.detector,
+        "--stub_latency_ms", str(args.stub_latency_ms),
+        "--stub_mode", args.stub_mode,
+        "--clip_seconds", str(args.clip_seconds),
+        "--log_dir", str(log_dir / f"SIM_{index}"),
+    ]
+    if args.cascade:
+        cmd.append("--cascade")
+    if args.rtsp_base:
+        cmd += ["--mode", "rtsp", "--rtsp_url", f"{args.rtsp_base}/sim{index}"]
+    else:
+        cmd += ["--mode", "file", "--video_path", args.video_path]
+    return port, subprocess.Popen(cmd, cwd=BASE_DIR, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_live(ports, timeout):
+    deadline = time.monotonic() + timeout
+    pending = set(ports)
+    while pending and time.monotonic() < deadline:
+        for port in list(pending):
+            try:
+                status = json.loads(fetch(f"http://127.0.0.1:{port}/status", timeout=1.0))
+            except (OSError, ValueError):
+                continue
+            if (status.get("camera") or {}).get("state") == "live":
+                pending.discard(port)
+        time.sleep(0.5)
+    if pending:
+        raise RuntimeError(f"Cameras on ports {sorted(pending)} did not go live")
+
+
+def scrape(ports):
+    return {port: parse_metrics(fetch(f"http://127.0.0.1:{port}/metrics").decode()) for port in ports}
+
+
+def run_step(cameras, viewers, args, work_dir):
+    log = (work_dir / f"step-{cameras}x{viewers}.log").open("wb")
+    feeders = start_feeders(cameras, args, log) if args.rtsp_base else []
+    servers = [start_server(i, args, work_dir, log) for i in range(cameras)]
+    ports = [port for port, _ in servers]
+    clients = []
+    try:
+        wait_live(ports, args.startup_timeout)
+        query = f"?w={args.viewer_width}" if args.viewer_width else ""
+        stream_clients = [
+            StreamViewer(f"http://127.0.0.1:{ports[i % cameras]}/stream{query}")
+            for i in range(viewers)
+        ]
+        pollers = [
+            StatusPoller(f"http://127.0.0.1:{ports[i % cameras]}/status")
+            for i in range(args.status_clients)
+        ]
+        clients = stream_clients + pollers
+        for client in clients:
+            client.start()
+        time.sleep(args.warmup)
+
+        window_start = time.monotonic()
+        before = scrape(ports)
+        usage_before = [process_usage(proc.pid) for _, proc in servers]
+        time.sleep(args.duration)
+        after = scrape(ports)
+        usage_after = [process_usage(proc.pid) for _, proc in servers]
+        elapsed = time.monotonic() - window_start
+    finally:
+        for client in clients:
+            client.stop_event.set()
+        for _, proc in servers:
+            proc.terminate()
+        for proc in feeders:
+            proc.terminate()
+        for proc in [p for _, p in servers] + feeders:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        log.close()
+
+    fps = []
+    age_count = age_sum = 0.0
+    age_p95 = []
+    for index, port in enumerate(ports):
+        camera = f"SIM_{index}"
+        frames = _sample(after[port], "cvbsms_frames_processed_total", camera=camera) - _sample(
+            before[port], "cvbsms_frames_processed_total", camera=camera
+        )
+        fps.append(frames / elapsed)
+        count, total, buckets = _histogram_delta(
+            before[port], after[port], "cvbsms_frame_age_seconds", camera
+        )
+        age_count += count
+        age_sum += total
+        quantile = _histogram_quantile(buckets, count, 0.95)
+        if quantile is not None:
+            age_p95.append(quantile)
+
+    intervals = [i for client in stream_clients for i in client.intervals(window_start)]
+    viewer_fps = [
+        len(client.intervals(window_start)) / elapsed for client in stream_clients
+    ]
+    status = [
+        latency for poller in pollers for started, latency in poller.latencies
+        if started >= window_start
+    ]
+    cpu = rss = None
+    if all(u[0] is not None for u in usage_before + usage_after):
+        cpu = sum(b[0] - a[0] for a, b in zip(usage_before, usage_after)) / elapsed * 100
+        rss = sum(u[1] for u in usage_after) / 1e6
+
+    return {
+        "cameras": cameras,
+        "viewers": viewers,
+        "status_clients": args.status_clients,
+        "detector": (args.detector if args.detector == "yolo" else f"stub-{args.stub_mode}")
+        + ("+cascade" if args.cascade else ""),
+        "fps_target": args.fps,
+        "fps_mean": _round(statistics.mean(fps), 2),
+        "fps_min": _round(min(fps), 2),
+        "frame_age_mean_ms": _round(age_sum / age_count * 1000 if age_count else None),
+        "frame_age_p95_ms": _round(max(age_p95) * 1000 if age_p95 else None),
+        "viewer_fps_mean": _round(statistics.mean(viewer_fps), 2) if viewer_fps else None,
+        "viewer_interval_p95_ms": _round(
+            _percentile(intervals, 0.95) * 1000 if intervals else None
+        ),
+        "viewer_jitter_ms": _round(
+            statistics.pstdev(intervals) * 1000 if len(intervals) > 1 else None
+        ),
+        "status_p95_ms": _round(_percentile(status, 0.95) * 1000 if status else None),
+        "cpu_percent": _round(cpu),
+        "rss_mb": _round(rss),
+    }
+
+
+def compare(rows, baseline_path, tolerance):
+    """
+    Flags steps whose minimum camera fps fell more than tolerance below
+    the same (cameras, viewers) step in a previous run
+    """
+    with open(baseline_path, newline="") as f:
+        baseline = {(int(r["cameras"]), int(r["viewers"])): r for r in csv.DictReader(f)}
+    regressions = []
+    for row in rows:
+        previous = baseline.get((row["cameras"], row["viewers"]))
+        if previous is None or not previous["fps_min"]:
+            continue
+        floor = float(previous["fps_min"]) * (1 - tolerance)
+        if row["fps_min"] < floor:
+            regressions.append(
+                f"{row['cameras']} cameras x {row['viewers']} viewers: "
+                f"fps_min {row['fps_min']} < {floor:.2f} (baseline {previous['fps_min']})"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure stream_server capacity with simulated cameras and viewers"
+    )
+    parser.add_argument("--cameras", type=str, default="1,2,4", help="Camera counts to step through")
+    parser.add_argument("--viewers", type=str, default="0,4", help="/stream client counts per step")
+    parser.add_argument("--status_clients", type=int, default=2)
+    parser.add_argument("--video_path", type=str, default=str(BASE_DIR / "videos" / "test.mp4"))
+    parser.add_argument(
+        "--rtsp_base",
+        type=str,
+        default=None,
+        help="Feed cameras over RTSP via ffmpeg to this server (e.g. rtsp://localhost:8554)",
+    )
+    parser.add_argument("--fps", type=int, default=12)
+    parser.add_argument("--detector", choices=["yolo", "stub"], default="stub")
+    parser.add_argument("--stub_latency_ms", type=float, default=30.0)
+    parser.add_argument("--stub_mode", choices=["sleep", "cpu"], default="sleep")
+    parser.add_argument("--cascade", action="store_true", help="Run servers with --cascade")
+    parser.add_argument("--clip_seconds", type=float, default=0.0)
+    parser.add_argument("--viewer_width", type=int, default=None)
+    parser.add_argument("--base_port", type=int, default=8100)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--startup_timeout", type=float, default=60.0)
+    parser.add_argument("--output", type=str, default=str(LOADTEST_FILE))
+    parser.add_argument("--baseline", type=str, default=None, help="Previous output to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if not args.rtsp_base and not Path(args.video_path).exists():
+        print(f"Video not found: {args.video_path}")
+        return 1
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="cvbsms-loadtest-") as tmp:
+        work_dir = Path(tmp)
+        for cameras in _counts(args.cameras):
+            for viewers in _counts(args.viewers):
+                print(f"Running {cameras} cameras x {viewers} viewers ...", flush=True)
+                row = run_step(cameras, viewers, args, work_dir)
+                rows.append(row)
+                print("  " + ", ".join(f"{k}={row[k]}" for k in FIELDS[4:]), flush=True)
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with output.open("w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Capacity curve: {output}")
+
+    if args.baseline:
+        regressions = compare(rows, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
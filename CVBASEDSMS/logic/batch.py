@@ -0,0 +1,230 @@
+import csv
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import cv2
+
+from logic.events import mark_events_logged, update_event_state
+from logic.pipeline import analyze_frame, violation_evidence
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+REPORT_FILE = BASE_DIR / "logs" / "batch_report.csv"
+REPORT_FIELDS = [
+    "video",
+    "frame_index",
+    "video_time",
+    "camera_id",
+    "violations",
+    "severity",
+    "event_ids",
+]
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".m4v"}
+MIN_CHUNK_FRAMES = 600
+# Offline runs have no wall clock, so cooldowns are measured in video time.
+VIDEO_EPOCH = datetime(1970, 1, 1)
+
+
+def list_videos(path):
+    path = Path(path)
+    if path.is_dir():
+        return sorted(p for p in path.iterdir() if p.suffix.lower() in VIDEO_EXTENSIONS)
+    return [path]
+
+
+def probe_video(video_path):
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"Unable to open video: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    cap.release()
+    return (fps if fps > 0 else 25.0), total
+
+
+def plan_chunks(total_frames, workers, min_chunk_frames=MIN_CHUNK_FRAMES):
+    """
+    Splits [0, total_frames) into seekable ranges, one per worker at most.
+    An unknown frame count yields a single open-ended chunk
+    """
+    if total_frames <= 0:
+        return [(0, None)]
+    chunk_size = max(min_chunk_frames, math.ceil(total_frames / max(workers, 1)))
+    return [
+        (start, min(start + chunk_size, total_frames))
+        for start in range(0, total_frames, chunk_size)
+    ]
+
+
+def _seek(cap, video_path, start):
+    if start == 0:
+        return cap
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    pos = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    if pos > start or pos < 0:
+        # Some containers land past the target; restart and step forward instead.
+        cap.release()
+        cap = cv2.VideoCapture(str(video_path))
+        pos = 0
+    while pos < start and cap.grab():
+        pos += 1
+    return cap
+
+
+def analyze_chunk(job):
+    """
+    Runs detection and rules over one frame range. Only frames with
+    violations are returned; event confirmation happens after stitching
+    """
+    video_path, start, end = job
+    started = time.perf_counter()
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"Unable to open video: {video_path}")
+    cap = _seek(cap, video_path, start)
+
+    detections = []
+    frame_index = start
+    while end is None or frame_index < end:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        persons, alert, all_violations = analyze_frame(frame)
+        h, w = frame.shape[:2]
+        evidence = violation_evidence(persons, w, h)
+        if all_violations or evidence:
+            detections.append((frame_index, alert, all_violations, evidence))
+        frame_index += 1
+    cap.release()
+
+    return {
+        "video": str(video_path),
+        "start": start,
+        "frames_read": frame_index - start,
+        "detections": detections,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def stitch_events(chunks, fps, camera_id):
+    """
+    Replays the event state machine over every frame of a video in order,
+    so confirmation and cooldown carry across chunk boundaries
+    """
+    detections = {}
+    total_frames = 0
+    for chunk in sorted(chunks, key=lambda c: c["start"]):
+        for frame_index, alert, all_violations, evidence in chunk["detections"]:
+            detections[frame_index] = (alert, all_violations, evidence)
+        total_frames = max(total_frames, chunk["start"] + chunk["frames_read"])
+
+    event_state = {}
+    rows = []
+    for frame_index in range(total_frames):
+        alert, all_violations, evidence = detections.get(frame_index, ("INFO", [], {}))
+        now = VIDEO_EPOCH + timedelta(seconds=frame_index / fps)
+        events_to_log = update_event_state(
+            event_state,
+            all_violations,
+            frame_index,
+            now,
+            (frame_index, frame_index / fps),
+            evidence=evidence,
+        )
+        if not events_to_log:
+            continue
+        violations_to_log = [v for v in all_violations if v[3] in events_to_log]
+        if not violations_to_log:
+            continue
+        rows.append(
+            {
+                "frame_index": frame_index,
+                "video_time": f"{frame_index / fps:.2f}",
+                "camera_id": camera_id,
+                "violations": ", ".join([v[1] for v in violations_to_log]),
+                "severity": alert,
+                "event_ids": " ".join(sorted(events_to_log)),
+            }
+        )
+        mark_events_logged(event_state, events_to_log, now)
+
+    return rows, total_frames
+
+
+def write_report(report_path, video_rows):
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with report_path.open(mode="w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        for video, rows in video_rows:
+            for row in rows:
+                writer.writerow({"video": str(video), **row})
+
+
+def run_batch(path, camera_id, report_path=None, workers=None):
+    report_path = Path(report_path) if report_path else REPORT_FILE
+    workers = workers or os.cpu_count() or 1
+    videos = list_videos(path)
+    if not videos:
+        print(f"No videos found in {path}")
+        return 1
+
+    jobs = []
+    meta = {}
+    for video in videos:
+        fps, total = probe_video(video)
+        chunks = plan_chunks(total, workers)
+        meta[str(video)] = {"fps": fps, "chunks": len(chunks)}
+        jobs.extend((video, start, end) for start, end in chunks)
+
+    started = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in pool.map(analyze_chunk, jobs):
+            results.setdefault(chunk["video"], []).append(chunk)
+    wall_seconds = time.perf_counter() - started
+
+    stats = {"videos": [], "workers": workers, "wall_seconds": round(wall_seconds, 3)}
+    total_frames = 0
+    total_events = 0
+    video_rows = []
+
+    for video in videos:
+        chunks = results.get(str(video), [])
+        rows, frames = stitch_events(chunks, meta[str(video)]["fps"], camera_id)
+        video_rows.append((video, rows))
+        total_frames += frames
+        total_events += len(rows)
+        stats["videos"].append(
+            {
+                "video": str(video),
+                "frames": frames,
+                "chunks": meta[str(video)]["chunks"],
+                "logged": len(rows),
+                "worker_seconds": round(sum(c["seconds"] for c in chunks), 3),
+            }
+        )
+    write_report(report_path, video_rows)
+
+    stats["frames"] = total_frames
+    stats["logged"] = total_events
+    stats["fps"] = round(total_frames / wall_seconds, 2) if wall_seconds > 0 else 0.0
+    stats_path = report_path.with_suffix(".stats.json")
+    stats_path.write_text(json.dumps(stats, indent=2))
+
+    for item in stats["videos"]:
+        print(
+            f"{item['video']}: {item['frames']} frames in {item['chunks']} chunks, "
+            f"{item['logged']} logged"
+        )
+    print(
+        f"Processed {total_frames} frames from {len(videos)} video(s) in "
+        f"{wall_seconds:.1f}s ({stats['fps']} fps, {workers} workers)"
+    )
+    print(f"Report: {report_path}")
+    print(f"Stats: {stats_path}")
+    return 0
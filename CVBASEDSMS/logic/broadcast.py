@@ -0,0 +1,42 @@
+import json
+import threading
+from collections import deque
+
+
+class EventBroadcaster:
+    """
+    Bounded in-memory ring of published events. Readers wait for ids
+    newer than the last one they saw, so any number of clients can follow
+    along (and resume after a reconnect) without per-client queues.
+    """
+
+    def __init__(self, capacity=512):
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._events = deque(maxlen=capacity)
+        self._last_id = 0
+
+    def publish(self, event_type, data):
+        with self._lock:
+            self._last_id += 1
+            self._events.append((self._last_id, event_type, json.dumps(data)))
+            self._changed.notify_all()
+            return self._last_id
+
+    def last_id(self):
+        with self._lock:
+            return self._last_id
+
+    def wait_since(self, last_id, timeout=15.0):
+        """
+        Returns events with id > last_id, blocking up to timeout when there
+        are none. A last_id older than the ring yields everything retained.
+        """
+        with self._lock:
+            if self._last_id <= last_id:
+                self._changed.wait(timeout)
+            return [event for event in self._events if event[0] > last_id]
+
+
+def format_sse(event_id, event_type, data):
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n".encode("utf-8")
@@ -0,0 +1,194 @@
+import random
+import threading
+import time
+
+import cv2
+
+CONNECTING = "connecting"
+LIVE = "live"
+STALE = "stale"
+DEAD = "dead"
+STATES = (CONNECTING, LIVE, STALE, DEAD)
+
+
+class LatestFrameReader:
+    """
+    Drains a capture on its own thread so the consumer always gets the
+    newest frame. Frames nobody asked for are only grab()bed; the BGR
+    conversion and copy in retrieve() run for delivered frames only.
+
+    Opening and reconnecting also happen on that thread, with jittered
+    exponential backoff, so a camera that is down never blocks the
+    caller. File sources can be paced to realtime_fps and looped.
+
+    Every grabbed frame, delivered or not, takes the next frame id, so
+    gaps in the ids a consumer sees are frames it never got.
+
+    on_decode receives the seconds each retrieve() took. Waiting for the
+    next grab is not included, so it measures decode cost rather than
+    the camera's frame interval.
+    """
+
+    def __init__(
+        self,
+        source,
+        api_preference=cv2.CAP_FFMPEG,
+        realtime_fps=None,
+        loop=False,
+        base_delay=0.5,
+        max_delay=30.0,
+        stale_after=5.0,
+        dead_after=5,
+        on_drop=None,
+        on_reconnect=None,
+        on_decode=None,
+        first_frame_id=1,
+    ):
+        self.source = source
+        self.api_preference = api_preference
+        self.frame_interval = 1.0 / realtime_fps if realtime_fps else 0.0
+        self.loop = loop
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stale_after = stale_after
+        self.dead_after = dead_after
+        self.on_drop = on_drop
+        self.on_reconnect = on_reconnect
+        self.on_decode = on_decode
+        self._cap = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._wanted = threading.Event()
+        self._ready = threading.Event()
+        self._frame = None
+        self._grabbed_at = None
+        self._captured_at = None
+        self._frame_id = None
+        self.next_frame_id = first_frame_id
+        self._state = CONNECTING
+        self._failures = 0
+        self._reconnects = 0
+        self._last_grab = None
+        self._started_at = None
+
+    def start(self):
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        """
+        Asks the worker to exit; the capture is released on its own
+        thread, so a worker stuck in grab() can be abandoned safely
+        """
+        self._stop.set()
+        self._wanted.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def read(self, timeout=1.0):
+        """
+        Returns (ok, frame, age_seconds, (frame_id, captured_at)) for the
+        next frame grabbed after the call. Age is measured from grab to
+        hand-off; captured_at is the grab time in epoch seconds.
+        """
+        self._ready.clear()
+        self._wanted.set()
+        if not self._ready.wait(timeout):
+            return False, None, None, None
+        frame, grabbed_at = self._frame, self._grabbed_at
+        info = (self._frame_id, self._captured_at)
+        self._frame = None
+        if frame is None:
+            return False, None, None, None
+        return True, frame, time.monotonic() - grabbed_at, info
+
+    def health(self):
+        now = time.monotonic()
+        state = self._state
+        since = self._last_grab or self._started_at
+        age = now - since if since is not None else None
+        if state == LIVE and age is not None and age > self.stale_after:
+            state = STALE
+        return {
+            "state": state,
+            "frame_age": round(age, 3) if age is not None else None,
+            "failures": self._failures,
+            "reconnects": self._reconnects,
+        }
+
+    def _open(self):
+        self._state = DEAD if self._failures >= self.dead_after else CONNECTING
+        if self._failures:
+            delay = min(self.max_delay, self.base_delay * 2 ** (self._failures - 1))
+            if self._stop.wait(delay * random.uniform(0.5, 1.0)):
+                return False
+        cap = cv2.VideoCapture(self.source, self.api_preference)
+        if not cap.isOpened():
+            cap.release()
+            self._failures += 1
+            return False
+        self._cap = cap
+        return True
+
+    def _lost(self):
+        self._cap.release()
+        self._cap = None
+        self._failures += 1
+        self._reconnects += 1
+        if self.on_reconnect is not None:
+            self.on_reconnect()
+
+    def _run(self):
+        grabbed_since_open = 0
+        next_grab = 0.0
+        try:
+            while not self._stop.is_set():
+                if self._cap is None:
+                    if not self._open():
+                        continue
+                    grabbed_since_open = 0
+
+                if self.frame_interval:
+                    wait = next_grab - time.monotonic()
+                    if wait > 0 and self._stop.wait(wait):
+                        break
+                    next_grab = time.monotonic() + self.frame_interval
+
+                if not self._cap.grab():
+                    if self.loop and grabbed_since_open:
+                        self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        grabbed_since_open = 0
+                        continue
+                    self._lost()
+                    continue
+                grabbed_at = time.monotonic()
+                captured_at = time.time()
+                frame_id = self.next_frame_id
+                self.next_frame_id += 1
+                grabbed_since_open += 1
+                self._last_grab = grabbed_at
+                self._failures = 0
+                self._state = LIVE
+
+                if not self._wanted.is_set():
+                    if self.on_drop is not None:
+                        self.on_drop()
+                    continue
+
+                started = time.perf_counter()
+                ok, frame = self._cap.retrieve()
+                if self.on_decode is not None:
+                    self.on_decode(time.perf_counter() - started)
+                if not ok:
+                    continue
+                self._frame = frame
+                self._grabbed_at = grabbed_at
+                self._captured_at = captured_at
+                self._frame_id = frame_id
+                self._wanted.clear()
+                self._ready.set()
+        finally:
+            if self._cap is not None:
+                self._cap.release()
@@ -0,0 +1,125 @@
+import numpy as np
+
+from logic import trace
+from logic.context import get_person_zone, is_person_at_height
+from logic.perception import class_groups_from_names, result_rows, run_detector
+from logic.rules import HIGH_RISK
+
+CROP_MARGIN = 0.15
+
+
+def needs_ppe_check(bbox, w, h):
+    """
+    True when a rule could flag this person: helmets are only checked in
+    the high-risk zone and harnesses only at height
+    """
+    return get_person_zone({"bbox": bbox}, w) == HIGH_RISK or is_person_at_height(bbox, h)
+
+
+def crop_box(bbox, w, h, margin=CROP_MARGIN):
+    x1, y1, x2, y2 = bbox
+    mx = int((x2 - x1) * margin)
+    my = int((y2 - y1) * margin)
+    return max(0, x1 - mx), max(0, y1 - my), min(w, x2 + mx), min(h, y2 + my)
+
+
+class CascadeDetector:
+    """
+    Two-stage detection: persons first, then the PPE model as one batch
+    over crops of only the persons a rule could flag.
+
+    Stage one uses person_model (default: the PPE model itself) at a
+    small imgsz, restricted to person classes, and is only re-run every
+    person_refresh frames; in between the previous frame's person boxes
+    are reused. Output has the same (N, 6) layout as run_detector, so
+    associate_persons and the rules are unchanged.
+    """
+
+    def __init__(
+        self,
+        model,
+        person_model=None,
+        conf=0.25,
+        person_imgsz=320,
+        crop_imgsz=320,
+        person_refresh=1,
+        crop_margin=CROP_MARGIN,
+    ):
+        self.conf = conf
+        self.person_imgsz = person_imgsz
+        self.crop_imgsz = crop_imgsz
+        self.person_refresh = max(1, person_refresh)
+        self.crop_margin = crop_margin
+        self.shared_person_model = person_model is None
+        self.person_model = person_model
+        self.set_model(model)
+        self._persons = np.zeros((0, 6), dtype=np.float32)
+        self.last_crops = 0
+
+    def set_model(self, model):
+        """
+        Switches the PPE model (and the person stage too when it shares
+        the PPE model), e.g. after a hot swap
+        """
+        person_model = model if self.shared_person_model else self.person_model
+        person_ids, _, _ = class_groups_from_names(person_model.names)
+        ppe_person_classes = sorted(class_groups_from_names(model.names)[0])
+        self.person_classes = sorted(person_ids)
+        self.ppe_person_classes = ppe_person_classes
+        self.output_person_class = min(ppe_person_classes, default=0)
+        self.person_model = person_model
+        self.model = model
+        # Re-detect persons on the next frame rather than reuse boxes
+        # from the old model.
+        self._frames = 0
+
+    def _detect_persons(self, frame, imgsz):
+        if self._frames % self.person_refresh == 0:
+            with trace.span("detect_persons"):
+                rows = run_detector(
+                    frame,
+                    self.person_model,
+                    conf=self.conf,
+                    imgsz=imgsz,
+                    classes=self.person_classes,
+                )
+            # Report persons under the PPE model's class id so
+            # associate_persons sees one label space.
+            rows[:, 5] = self.output_person_class
+            self._persons = rows
+        self._frames += 1
+        return self._persons
+
+    def __call__(self, frame, imgsz=None):
+        """
+        imgsz (from the latency controller) can only lower the person
+        stage resolution
+        """
+        h, w = frame.shape[:2]
+        person_imgsz = min(self.person_imgsz, imgsz) if imgsz else self.person_imgsz
+        persons = self._detect_persons(frame, person_imgsz)
+
+        boxes = []
+        crops = []
+        for row in persons:
+            bbox = tuple(int(v) for v in row[:4])
+            if not needs_ppe_check(bbox, w, h):
+                continue
+            x1, y1, x2, y2 = crop_box(bbox, w, h, self.crop_margin)
+            if x2 - x1 < 2 or y2 - y1 < 2:
+                continue
+            boxes.append((x1, y1))
+            crops.append(frame[y1:y2, x1:x2])
+        self.last_crops = len(crops)
+
+        rows = [persons]
+        if crops:
+            with trace.span("detect_ppe_crops", args={"crops": len(crops)}):
+                results = self.model(crops, conf=self.conf, imgsz=self.crop_imgsz)
+            for (x1, y1), result in zip(boxes, results):
+                crop_rows = result_rows(result)
+                crop_rows = crop_rows[~np.isin(crop_rows[:, 5], self.ppe_person_classes)]
+                crop_rows[:, [0, 2]] += x1
+                crop_rows[:, [1, 3]] += y1
+                rows.append(crop_rows)
+        return np.concatenate(rows)
@@ -0,0 +1,191 @@
+import csv
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+CLIPS_DIR = BASE_DIR / "logs" / "clips"
+# Encoded 1080p at the default quality and 12-15 fps runs 3-5 MB/s.
+BYTES_PER_SECOND = 6 * 1024 * 1024
+
+
+class ClipRecorder:
+    """
+    Keeps the last few seconds of already-encoded JPEG frames for one
+    camera and hands pre/post-event clips to a background writer.
+
+    Everything on the frame loop side is O(1) per frame and never touches
+    the disk; if the writer falls behind, new clips are refused instead.
+    A clip takes one of max_queued slots when triggered and frees it once
+    written, so a clip that was accepted is never dropped later.
+
+    Memory is capped at max_bytes, by default bytes_per_second for each
+    second of pre and post evidence; the ring gets the pre share and the
+    open clip (which shares the ring's frames) the whole budget. If the
+    cap ever cuts the pre-roll short, that is reported once.
+    """
+
+    def __init__(
+        self,
+        camera_id,
+        pre_seconds=5.0,
+        post_seconds=5.0,
+        max_bytes=None,
+        bytes_per_second=BYTES_PER_SECOND,
+        out_dir=CLIPS_DIR,
+        max_queued=4,
+        on_written=None,
+        on_dropped=None,
+    ):
+        self.camera_id = camera_id
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        if max_bytes is None:
+            max_bytes = int((pre_seconds + post_seconds) * bytes_per_second)
+        self.max_bytes = max_bytes
+        total_seconds = pre_seconds + post_seconds
+        self.ring_bytes = int(max_bytes * pre_seconds / total_seconds) if total_seconds else 0
+        self.out_dir = Path(out_dir)
+        self.on_written = on_written
+        self.on_dropped = on_dropped
+        self._lock = threading.Lock()
+        self._frames = deque()
+        self._bytes = 0
+        self._open_clip = None
+        self._closing = False
+        self._warned_short = False
+        self._slots = threading.BoundedSemaphore(max_queued)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add_frame(self, timestamp, data):
+        with self._lock:
+            if self._closing:
+                return
+            self._frames.append((timestamp, data))
+            self._bytes += len(data)
+            while self._frames and timestamp - self._frames[0][0] > self.pre_seconds:
+                _, old = self._frames.popleft()
+                self._bytes -= len(old)
+            while self._frames and self._bytes > self.ring_bytes:
+                _, old = self._frames.popleft()
+                self._bytes -= len(old)
+                self._warn_short(timestamp)
+
+            clip = self._open_clip
+            if clip is None:
+                return
+            clip["frames"].append((timestamp, data))
+            clip["bytes"] += len(data)
+            if timestamp >= clip["until"] or clip["bytes"] > self.max_bytes:
+                self._open_clip = None
+                self._submit(clip)
+
+    def _warn_short(self, timestamp):
+        if self._warned_short or not self._frames:
+            return
+        self._warned_short = True
+        kept = timestamp - self._frames[0][0]
+        print(
+            f"[{self.camera_id}] clip buffer cap of {self.max_bytes // (1024 * 1024)} MB "
+            f"keeps only {kept:.1f}s of the {self.pre_seconds:.1f}s pre-roll"
+        )
+
+    def trigger(self, event_ids, timestamp):
+        """
+        Starts (or extends) a clip covering pre_seconds before and
+        post_seconds after timestamp. Returns the clip directory, or None
+        when the writer is too far behind to take another clip or the
+        recorder is closing.
+        """
+        with self._lock:
+            if self._closing:
+                return None
+            clip = self._open_clip
+            if clip is not None:
+                # Overlapping events share one clip instead of buffering twice.
+                clip["until"] = timestamp + self.post_seconds
+                clip["event_ids"].update(event_ids)
+                return clip["path"]
+
+            if not self._slots.acquire(blocking=False):
+                if self.on_dropped is not None:
+                    self.on_dropped()
+                return None
+
+            started = datetime.fromtimestamp(timestamp)
+            name = started.strftime("%Y%m%d_%H%M%S_%f")[:-3]
+            frames = list(self._frames)
+            self._open_clip = {
+                "path": self.out_dir / self.camera_id / name,
+                "event_ids": set(event_ids),
+                "started_at": started,
+                "until": timestamp + self.post_seconds,
+                "frames": frames,
+                "bytes": self._bytes,
+            }
+            return self._open_clip["path"]
+
+    def _submit(self, clip):
+        # The slot taken in trigger() guarantees room.
+        self._queue.put_nowait(clip)
+
+    def close(self, timeout=10.0):
+        """
+        Stops taking frames and clips, writes the open clip with the
+        frames it has so far and waits up to timeout for queued clips,
+        whose paths are already in the log
+        """
+        with self._lock:
+            if self._closing:
+                return
+            self._closing = True
+            clip, self._open_clip = self._open_clip, None
+            if clip is not None:
+                self._submit(clip)
+            self._queue.put_nowait(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            clip = self._queue.get()
+            if clip is None:
+                return
+            try:
+                self._write(clip)
+            except Exception as exc:
+                # Any failure costs this clip only; the writer keeps going.
+                print(f"Clip write failed for {clip['path']}: {exc}")
+                if self.on_dropped is not None:
+                    self.on_dropped()
+                continue
+            finally:
+                self._slots.release()
+            if self.on_written is not None:
+                self.on_written()
+
+    def _write(self, clip):
+        path = clip["path"]
+        path.mkdir(parents=True, exist_ok=True)
+        frames = clip["frames"]
+        first_ts = frames[0][0] if frames else 0.0
+        for i, (timestamp, data) in enumerate(frames):
+            offset_ms = int((timestamp - first_ts) * 1000)
+            (path / f"{i:05d}_{offset_ms:06d}.jpg").write_bytes(data)
+
+        index_file = self.out_dir / "index.csv"
+        file_exists = index_file.exists()
+        with index_file.open(mode="a", newline="") as f:
+            writer = csv.writer(f)
+            if not file_exists:
+                writer.writerow(["timestamp", "camera_id", "event_ids", "frames", "path"])
+            writer.writerow([
+                clip["started_at"].strftime("%Y-%m-%d %H:%M:%S"),
+                self.camera_id,
+                " ".join(sorted(clip["event_ids"])),
+                len(frames),
+                str(path),
+            ])
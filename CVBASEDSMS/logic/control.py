@@ -0,0 +1,148 @@
+import statistics
+import threading
+import time
+from collections import deque
+
+IMGSZ_STEPS = (640, 576, 512, 448, 384, 320)
+
+
+class LatencyController:
+    """
+    Keeps one camera's per-frame processing time inside a budget by
+    trading inference resolution and frame stride.
+
+    Over budget it first lowers imgsz, then raises stride; with clear
+    headroom it undoes those in reverse order. Each sample is the mean
+    cost per frame of one stride cycle (an inferred frame and the skipped
+    frames after it), so inferred and skipped frames are not compared
+    separately. Decisions use the median of a window of samples and the
+    window restarts after every change, so one slow frame never triggers
+    an adjustment.
+
+    A recovery step is only taken when the cost estimated for the
+    setting it returns to (scaled by stride, or by pixel area for imgsz)
+    is still within headroom, and not during the cooldown_windows
+    windows after a degrade, so a cost just over budget settles instead
+    of flipping between two settings.
+    """
+
+    def __init__(
+        self,
+        camera_id,
+        budget_seconds,
+        min_imgsz=320,
+        max_imgsz=640,
+        max_stride=4,
+        window=24,
+        headroom=0.6,
+        cooldown_windows=2,
+        history=50,
+        on_adjust=None,
+    ):
+        self.camera_id = camera_id
+        self.budget_seconds = budget_seconds
+        self.steps = [s for s in IMGSZ_STEPS if min_imgsz <= s <= max_imgsz] or [max_imgsz]
+        self.max_stride = max(1, max_stride)
+        self.window = window
+        self.headroom = headroom
+        self.cooldown_windows = cooldown_windows
+        self.on_adjust = on_adjust
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self._cycle_seconds = 0.0
+        self._cycle_frames = 0
+        self._step = 0
+        self._stride = 1
+        self._hold = 0
+        self._adjustments = deque(maxlen=history)
+
+    @property
+    def imgsz(self):
+        return self.steps[self._step]
+
+    @property
+    def stride(self):
+        return self._stride
+
+    def observe(self, frame_seconds, inferred=True):
+        """
+        Records the processing time of one frame, excluding the wait for
+        it. A new stride cycle starts at each inferred frame.
+        """
+        if inferred and self._cycle_frames:
+            self._add_sample(self._cycle_seconds / self._cycle_frames)
+            self._cycle_seconds = 0.0
+            self._cycle_frames = 0
+        self._cycle_seconds += frame_seconds
+        self._cycle_frames += 1
+
+    def _add_sample(self, seconds):
+        self._samples.append(seconds)
+        if len(self._samples) < self.window:
+            return
+        measured = statistics.median(self._samples)
+        if measured > self.budget_seconds:
+            self._degrade(measured)
+        elif self._hold > 0:
+            self._hold -= 1
+            self._samples.clear()
+        elif measured < self.budget_seconds * self.headroom:
+            self._recover(measured)
+
+    def _degrade(self, measured):
+        self._hold = self.cooldown_windows
+        if self._step < len(self.steps) - 1:
+            self._apply("degrade", "imgsz", self.imgsz, self.steps[self._step + 1], measured)
+            self._step += 1
+        elif self._stride < self.max_stride:
+            self._apply("degrade", "stride", self._stride, self._stride + 1, measured)
+            self._stride += 1
+
+    def _recover(self, measured):
+        limit = self.budget_seconds * self.headroom
+        if self._stride > 1:
+            # One inferred frame per stride frames carries nearly all the cost.
+            if measured * self._stride / (self._stride - 1) < limit:
+                self._apply("recover", "stride", self._stride, self._stride - 1, measured)
+                self._stride -= 1
+        elif self._step > 0:
+            larger = self.steps[self._step - 1]
+            # Inference cost grows roughly with the number of pixels.
+            if measured * (larger / self.imgsz) ** 2 < limit:
+                self._apply("recover", "imgsz", self.imgsz, larger, measured)
+                self._step -= 1
+
+    def _apply(self, direction, knob, old, new, measured):
+        adjustment = {
+            "at": time.time(),
+            "direction": direction,
+            "knob": knob,
+            "from": old,
+            "to": new,
+            "measured_ms": round(measured * 1000, 1),
+            "budget_ms": round(self.budget_seconds * 1000, 1),
+        }
+        with self._lock:
+            self._adjustments.append(adjustment)
+        self._samples.clear()
+        print(
+            f"[{self.camera_id}] {knob} {old} -> {new} "
+            f"(median {adjustment['measured_ms']} ms, budget {adjustment['budget_ms']} ms)"
+        )
+        if self.on_adjust is not None:
+            self.on_adjust(direction, knob)
+
+    def snapshot(self):
+        with self._lock:
+            adjustments = list(self._adjustments)
+        return {
+            "camera_id": self.camera_id,
+            "budget_ms": round(self.budget_seconds * 1000, 1),
+            "imgsz": self.imgsz,
+            "stride": self._stride,
+            "limits": {
+                "imgsz": [self.steps[-1], self.steps[0]],
+                "stride": [1, self.max_stride],
+            },
+            "adjustments": adjustments,
+        }
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import shutil
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from logic.perception import run_detector
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+CACHE_DIR = BASE_DIR / "cache" / "detections"
+FINGERPRINT_BLOCK = 1 << 20
+
+
+def video_fingerprint(path):
+    """
+    Hashes the file size plus its first, middle and last MiB, which tells
+    recordings apart without reading hours of video
+    """
+    path = Path(path)
+    size = path.stat().st_size
+    digest = hashlib.sha1(str(size).encode("utf-8"))
+    offsets = (
+        0,
+        max(0, size // 2 - FINGERPRINT_BLOCK // 2),
+        max(0, size - FINGERPRINT_BLOCK),
+    )
+    with path.open("rb") as f:
+        for offset in offsets:
+            f.seek(offset)
+            digest.update(f.read(FINGERPRINT_BLOCK))
+    return digest.hexdigest()
+
+
+def model_fingerprint(path):
+    digest = hashlib.sha1()
+    with Path(path).open("rb") as f:
+        for block in iter(lambda: f.read(FINGERPRINT_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(video_path, model_path, conf, imgsz):
+    payload = json.dumps(
+        {
+            "video": video_fingerprint(video_path),
+            "model": model_fingerprint(model_path),
+            "conf": conf,
+            "imgsz": imgsz,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:20]
+
+
+def build_cache(video_path, model, key, conf=0.25, imgsz=None, cache_dir=CACHE_DIR):
+    """
+    Runs the detector over every frame and stores the raw output in CSR
+    layout: detections.npy holds (N, 6) rows of x1, y1, x2, y2, conf, cls
+    and offsets.npy maps frame i to rows offsets[i]:offsets[i + 1]
+    """
+    target = Path(cache_dir) / key
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"Unable to open video: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    started = time.perf_counter()
+    frames = []
+    offsets = [0]
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        detections = run_detector(frame, model, conf=conf, imgsz=imgsz)
+        frames.append(detections)
+        offsets.append(offsets[-1] + len(detections))
+    cap.release()
+
+    tmp = target.with_name(key + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    detections = np.concatenate(frames) if frames else np.zeros((0, 6), dtype=np.float32)
+    np.save(tmp / "detections.npy", detections.astype(np.float32))
+    np.save(tmp / "offsets.npy", np.asarray(offsets, dtype=np.int64))
+    names = model.names if isinstance(model.names, dict) else dict(enumerate(model.names))
+    meta = {
+        "video": str(video_path),
+        "fps": fps,
+        "width": width,
+        "height": height,
+        "frames": len(frames),
+        "conf": conf,
+        "imgsz": imgsz,
+        "names": {str(k): v for k, v in names.items()},
+        "build_seconds": round(time.perf_counter() - started, 3),
+    }
+    (tmp / "meta.json").write_text(json.dumps(meta, indent=2))
+    shutil.rmtree(target, ignore_errors=True)
+    tmp.rename(target)
+    return target
+
+
+class DetectionCache:
+    def __init__(self, path):
+        path = Path(path)
+        self.meta = json.loads((path / "meta.json").read_text())
+        self.names = {int(k): v for k, v in self.meta["names"].items()}
+        self.detections = np.load(path / "detections.npy", mmap_mode="r")
+        self.offsets = np.load(path / "offsets.npy", mmap_mode="r")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def frame(self, index):
+        return self.detections[self.offsets[index]:self.offsets[index + 1]]
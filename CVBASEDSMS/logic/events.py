@@ -0,0 +1,155 @@
+from datetime import timedelta
+
+EVENT_CONFIRM_FRAMES = 5
+EVENT_COOLDOWN_SECONDS = 8
+EVENT_FORGET_FRAMES = 45
+# Evidence voting: each inferred frame multiplies an event's score by
+# EVIDENCE_DECAY and adds that frame's signed evidence (person confidence
+# while PPE is missing, minus PPE confidence while it is seen). Steady
+# 0.9-confidence detections confirm in 4 frames and a missed frame costs
+# a little score instead of the whole streak. The score cannot pass
+# evidence / (1 - decay), so a violation seen on EVENT_CONFIRM_FRAMES
+# consecutive frames also confirms, however low its confidence, as it
+# did before evidence voting.
+EVIDENCE_DECAY = 0.85
+EVIDENCE_THRESHOLD = 2.5
+# A score this low counts as a fresh start for the onset.
+EVIDENCE_FLOOR = 0.05
+
+
+def _cell(event_id):
+    prefix, _, cell = event_id.rpartition(":")
+    prefix, _, qcx = prefix.rpartition(":")
+    try:
+        return prefix, int(qcx), int(cell)
+    except ValueError:
+        return event_id, None, None
+
+
+def _adopt_neighbour(event_state, event_id, present):
+    """
+    Moves the state of the same violation one quantization cell away to
+    event_id when that event is not present this frame, so a worker
+    drifting across a cell border keeps the evidence gathered so far
+    """
+    prefix, qcx, qcy = _cell(event_id)
+    if qcx is None:
+        return None
+    best_id = None
+    best_score = EVIDENCE_FLOOR
+    for other_id, item in event_state.items():
+        if other_id in present or item["score"] <= best_score:
+            continue
+        other_prefix, ox, oy = _cell(other_id)
+        if other_prefix != prefix or ox is None:
+            continue
+        if abs(ox - qcx) <= 1 and abs(oy - qcy) <= 1:
+            best_id, best_score = other_id, item["score"]
+    if best_id is None:
+        return None
+    return event_state.pop(best_id)
+
+
+def _update_counts(event_state, current_event_ids, frame_index, frame_info):
+    for event_id in current_event_ids:
+        state_item = event_state.get(
+            event_id,
+            {"count": 0, "last_seen_frame": -1, "last_logged_at": None, "onset": None},
+        )
+        if state_item["last_seen_frame"] == frame_index - 1:
+            state_item["count"] += 1
+        else:
+            state_item["count"] = 1
+            state_item["onset"] = frame_info
+        state_item["last_seen_frame"] = frame_index
+        event_state[event_id] = state_item
+
+
+def _update_scores(event_state, current_event_ids, evidence, frame_index, frame_info):
+    for state_item in event_state.values():
+        gap = frame_index - state_item["scored_frame"]
+        if gap > 0:
+            state_item["score"] *= EVIDENCE_DECAY**gap
+            state_item["scored_frame"] = frame_index
+
+    # Violations without a confidence count as certain.
+    updates = {event_id: 1.0 for event_id in current_event_ids}
+    updates.update(evidence)
+    present = {event_id for event_id, value in updates.items() if value > 0}
+    for event_id, value in updates.items():
+        state_item = event_state.get(event_id)
+        if state_item is None:
+            if value <= 0:
+                # Counter-evidence only matters for events already tracked.
+                continue
+            state_item = _adopt_neighbour(event_state, event_id, present) or {
+                "score": 0.0,
+                "scored_frame": frame_index,
+                "count": 0,
+                "last_seen_frame": -1,
+                "last_logged_at": None,
+                "onset": None,
+            }
+            event_state[event_id] = state_item
+        if value > 0:
+            if state_item["score"] < EVIDENCE_FLOOR:
+                state_item["onset"] = frame_info
+            if state_item["last_seen_frame"] == frame_index - 1:
+                state_item["count"] += 1
+            else:
+                state_item["count"] = 1
+            state_item["last_seen_frame"] = frame_index
+        else:
+            state_item["count"] = 0
+        state_item["score"] = max(0.0, state_item["score"] + value)
+
+
+def update_event_state(
+    event_state, all_violations, frame_index, now, frame_info=None, evidence=None
+):
+    """
+    Advances event confirmation by one frame and returns the event ids
+    that are confirmed and out of cooldown. frame_info, a (frame_id,
+    captured_at) pair, is kept as the onset of each new streak.
+
+    With evidence ({event_id: signed confidence}, see
+    pipeline.violation_evidence) events confirm once their decaying score
+    reaches EVIDENCE_THRESHOLD or after EVENT_CONFIRM_FRAMES consecutive
+    frames; without it only the consecutive-frame rule applies.
+    """
+    current_event_ids = {v[3] for v in all_violations}
+
+    if evidence is None:
+        _update_counts(event_state, current_event_ids, frame_index, frame_info)
+    else:
+        _update_scores(event_state, current_event_ids, evidence, frame_index, frame_info)
+
+    stale_ids = [
+        event_id
+        for event_id, state_item in event_state.items()
+        if frame_index - state_item["last_seen_frame"] > EVENT_FORGET_FRAMES
+    ]
+    for event_id in stale_ids:
+        del event_state[event_id]
+
+    events_to_log = []
+    for event_id in current_event_ids:
+        state_item = event_state[event_id]
+        cooldown_done = (
+            state_item["last_logged_at"] is None
+            or (now - state_item["last_logged_at"]) >= timedelta(seconds=EVENT_COOLDOWN_SECONDS)
+        )
+        confirmed = state_item["count"] >= EVENT_CONFIRM_FRAMES
+        if evidence is not None:
+            confirmed = confirmed or state_item["score"] >= EVIDENCE_THRESHOLD
+        if confirmed and cooldown_done:
+            events_to_log.append(event_id)
+
+    return events_to_log
+
+
+def mark_events_logged(event_state, event_ids, now):
+    for event_id in event_ids:
+        event_state[event_id]["last_logged_at"] = now
+        # Later logs in the same streak have no onset of their own.
+        event_state[event_id]["onset"] = None
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+HEATMAP_DIR = BASE_DIR / "logs" / "heatmaps"
+GRID_SHAPE = (48, 64)
+# Each window is an exponentially decaying layer with this half-life.
+WINDOWS = {"hour": 3600.0, "day": 86400.0, "week": 7 * 86400.0}
+FLUSH_SECONDS = 30.0
+
+
+class HeatmapAccumulator:
+    """
+    Per-camera grid of violation foot points, one decaying layer per
+    window, kept in a memory-mapped .npy so it survives restarts.
+
+    add() and every query touch only the grid, never the log history.
+    Decay is applied lazily as one multiply per layer for the time
+    elapsed since the last update.
+    """
+
+    def __init__(
+        self,
+        camera_id,
+        out_dir=HEATMAP_DIR,
+        shape=GRID_SHAPE,
+        windows=WINDOWS,
+        flush_seconds=FLUSH_SECONDS,
+    ):
+        self.camera_id = camera_id
+        self.names = list(windows)
+        self.half_lives = np.asarray([windows[name] for name in self.names], dtype=np.float64)
+        self.flush_seconds = flush_seconds
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        self.path = out_dir / f"{camera_id}.npy"
+        self.meta_path = out_dir / f"{camera_id}.json"
+        self._lock = threading.Lock()
+
+        layers_shape = (len(self.names), *shape)
+        meta = self._read_meta()
+        if (
+            self.path.exists()
+            and meta.get("windows") == self.names
+            and tuple(meta.get("shape", ())) == layers_shape
+        ):
+            self.grid = np.load(self.path, mmap_mode="r+")
+            self._updated_at = meta["updated_at"]
+        else:
+            self.grid = np.lib.format.open_memmap(
+                self.path, mode="w+", dtype=np.float32, shape=layers_shape
+            )
+            self._updated_at = time.time()
+            meta = {}
+        self.events = meta.get("events", 0)
+        self._flush()
+
+    def _read_meta(self):
+        try:
+            return json.loads(self.meta_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _decay(self, now):
+        elapsed = now - self._updated_at
+        if elapsed <= 0:
+            return
+        factors = np.power(0.5, elapsed / self.half_lives).astype(np.float32)
+        self.grid *= factors[:, None, None]
+        self._updated_at = now
+
+    def add(self, bbox, frame_w, frame_h, now=None, weight=1.0):
+        """
+        Adds one confirmed violation at the person's foot point (bottom
+        centre of the box)
+        """
+        x1, _, x2, y2 = bbox
+        rows, cols = self.grid.shape[1:]
+        col = min(cols - 1, max(0, int((x1 + x2) / 2 / frame_w * cols)))
+        row = min(rows - 1, max(0, int(y2 / frame_h * rows)))
+        now = now if now is not None else time.time()
+        with self._lock:
+            self._decay(now)
+            self.grid[:, row, col] += weight
+            self.events += 1
+            if time.monotonic() - self._flushed_at >= self.flush_seconds:
+                self._flush()
+
+    def _flush(self):
+        self.grid.flush()
+        meta = {
+            "camera_id": self.camera_id,
+            "windows": self.names,
+            "shape": list(self.grid.shape),
+            "updated_at": self._updated_at,
+            "events": self.events,
+        }
+        tmp = self.meta_path.with_name(self.meta_path.name + ".tmp")
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self.meta_path)
+        self._flushed_at = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def snapshot(self, window="day", now=None):
+        """
+        Returns a copy of one window's grid decayed to now
+        """
+        layer = self.names.index(window)
+        now = now if now is not None else time.time()
+        with self._lock:
+            self._decay(now)
+            return np.array(self.grid[layer])
+
+    def to_json(self, window="day"):
+        grid = self.snapshot(window)
+        return {
+            "camera_id": self.camera_id,
+            "window": window,
+            "half_life_seconds": float(self.half_lives[self.names.index(window)]),
+            "rows": grid.shape[0],
+            "cols": grid.shape[1],
+            "max": float(grid.max()),
+            # grid[row][col] is the decayed violation count for that cell of
+            # the frame split into rows x cols.
+            "grid": np.round(grid, 3).tolist(),
+        }
+
+    def to_png(self, window="day", width=640, height=None):
+        """
+        Renders the window as a BGRA PNG whose alpha follows intensity,
+        ready to lay over the camera frame
+        """
+        grid = self.snapshot(window)
+        rows, cols = grid.shape
+        height = height or round(width * rows / cols)
+        peak = float(grid.max())
+        norm = grid / peak if peak > 0 else grid
+        norm = cv2.resize(norm, (width, height), interpolation=cv2.INTER_CUBIC)
+        norm = cv2.GaussianBlur(norm, (0, 0), sigmaX=width / cols)
+        norm = np.clip(norm / max(float(norm.max()), 1e-6), 0.0, 1.0)
+        image = cv2.applyColorMap((norm * 255).astype(np.uint8), cv2.COLORMAP_JET)
+        alpha = (np.sqrt(norm) * 200).astype(np.uint8)
+        ok, encoded = cv2.imencode(".png", np.dstack([image, alpha]))
+        if not ok:
+            raise RuntimeError("PNG encode failed")
+        return encoded.tobytes()
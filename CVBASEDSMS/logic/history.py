@@ -0,0 +1,347 @@
+import os
+import re
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from dateutil import tz
+
+from logic.logger import LOG_DIR, LOG_FILE, LOG_HEADER
+from logic.rules import CRITICAL, NO_HARNESS, NO_HELMET, WARNING
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+# violations.csv predates the partitioned log and mixes two formats.
+LEGACY_TIMESTAMP_FORMATS = ("%Y-%m-%d %H:%M:%S", "%d-%m-%Y %H:%M")
+LEGACY_VIOLATION_SEVERITY = {NO_HELMET: WARNING, NO_HARNESS: CRITICAL}
+# Frame-level markers the old log put among the violations.
+LEGACY_SEVERITY_TOKENS = {"CRITICAL_VIOLATION": CRITICAL}
+CATEGORICAL_COLUMNS = ["camera_id", "violation", "severity", "zone"]
+BBOX_COLUMNS = ["bbox_x1", "bbox_y1", "bbox_x2", "bbox_y2"]
+CSV_DTYPES = {
+    "camera_id": "category",
+    "event_id": str,
+    "violation": "category",
+    "severity": "category",
+    "zone": "category",
+    "bbox_x1": "Int32",
+    "bbox_y1": "Int32",
+    "bbox_x2": "Int32",
+    "bbox_y2": "Int32",
+    "clip": str,
+    "frame_id": "Int64",
+    "capture_to_log_ms": "Int32",
+}
+# The system zone file (TZ or /etc/localtime) with its DST rules, so each
+# timestamp gets the offset in force at that time, not the one at import.
+LOCAL_TZ = tz.gettz()
+# Parts touched this recently may still have a writer in another process.
+COMPACT_GRACE_SECONDS = 600
+CHUNK_ROWS = 100_000
+# Added by query_violations(with_source=True): the file a row came from
+# (day partition or legacy log) and its position there, which together
+# identify the row when every logged column ties.
+SOURCE_COLUMNS = ["source", "row"]
+_PARTITION_RE = re.compile(r"^violations-(\d{4}-\d{2}-\d{2})(?:\.(\d+))?\.(csv|parquet)$")
+
+
+def list_partitions(log_dir=None):
+    """
+    Maps each day to its CSV parts (in order) and compacted parquet file
+    """
+    log_dir = Path(log_dir) if log_dir is not None else LOG_DIR
+    days = {}
+    if not log_dir.exists():
+        return days
+    for path in log_dir.iterdir():
+        match = _PARTITION_RE.match(path.name)
+        if match is None:
+            continue
+        day = date.fromisoformat(match.group(1))
+        entry = days.setdefault(day, {"csv": [], "parquet": None})
+        if match.group(3) == "parquet":
+            entry["parquet"] = path
+        else:
+            entry["csv"].append((int(match.group(2) or 0), path))
+    for entry in days.values():
+        entry["csv"] = [path for _, path in sorted(entry["csv"])]
+    return days
+
+
+def _finalize(df):
+    """
+    Applies the dtypes every reader returns: naive local timestamps,
+    categorical labels and nullable integer boxes
+    """
+    df = df.dropna(subset=["timestamp"])
+    # Rows written before frame ids were logged lack the last columns.
+    for column in LOG_HEADER:
+        if column not in df.columns:
+            df[column] = pd.NA
+    for column in CATEGORICAL_COLUMNS:
+        df[column] = df[column].astype("category")
+    for column in BBOX_COLUMNS:
+        df[column] = df[column].astype("Int32")
+    for column in ("event_id", "clip"):
+        df[column] = df[column].fillna("").astype(str)
+    df["frame_id"] = df["frame_id"].astype("Int64")
+    df["capture_to_log_ms"] = df["capture_to_log_ms"].astype("Int32")
+    return df[LOG_HEADER + [column for column in SOURCE_COLUMNS if column in df.columns]]
+
+
+def empty_frame():
+    df = pd.DataFrame(columns=LOG_HEADER)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return _finalize(df)
+
+
+def _to_local(timestamps):
+    return timestamps.dt.tz_convert(LOCAL_TZ).dt.tz_localize(None)
+
+
+def to_utc(timestamps):
+    """
+    Converts naive local timestamps to UTC. Times in the repeated hour
+    when clocks go back are taken as the later one and times in the
+    skipped hour are moved forward.
+    """
+    if timestamps.dt.tz is not None:
+        return timestamps.dt.tz_convert("UTC")
+    return timestamps.dt.tz_localize(
+        LOCAL_TZ,
+        ambiguous=np.zeros(len(timestamps), dtype=bool),
+        nonexistent="shift_forward",
+    ).dt.tz_convert("UTC")
+
+
+def parse_timestamps(values):
+    return _to_local(pd.to_datetime(values, format=TIMESTAMP_FORMAT, utc=True, errors="coerce"))
+
+
+def normalize_legacy(df):
+    """
+    Converts rows in the old one-row-per-frame layout (timestamp,
+    camera_id, violations, severity) to one row per violation
+    """
+    timestamps = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    for fmt in LEGACY_TIMESTAMP_FORMATS:
+        missing = timestamps.isna()
+        timestamps[missing] = pd.to_datetime(
+            df.loc[missing, "timestamp"], format=fmt, errors="coerce"
+        )
+
+    frame_severity = df["severity"].astype(str).str.upper()
+    frame_severity = pd.Series(
+        np.select(
+            [frame_severity.str.contains("CRITICAL"), frame_severity.str.contains("WARNING")],
+            ["CRITICAL", "WARNING"],
+            "INFO",
+        ),
+        index=df.index,
+    )
+
+    rows = pd.DataFrame(
+        {
+            "timestamp": timestamps,
+            "camera_id": df["camera_id"].astype(str),
+            "violation": df["violations"].astype(str).str.split(","),
+            "frame_severity": frame_severity,
+        }
+    ).explode("violation")
+    rows["violation"] = rows["violation"].str.strip()
+    for token, severity in LEGACY_SEVERITY_TOKENS.items():
+        # Explode keeps the frame's index label on each of its rows.
+        frames = rows.index[rows["violation"] == token].unique()
+        rows.loc[frames, "frame_severity"] = severity
+    rows = rows[(rows["violation"] != "") & ~rows["violation"].isin(LEGACY_SEVERITY_TOKENS)]
+    rows["severity"] = (
+        rows["violation"].map(LEGACY_VIOLATION_SEVERITY).fillna(rows["frame_severity"])
+    )
+    rows["event_id"] = ""
+    rows["zone"] = ""
+    rows["clip"] = ""
+    for column in BBOX_COLUMNS:
+        rows[column] = pd.NA
+    return _finalize(rows.reset_index(drop=True))
+
+
+def is_legacy_csv(path):
+    return "violations" in pd.read_csv(path, nrows=0).columns
+
+
+def read_csv_part(path, local=True):
+    """
+    Reads one CSV part with naive local timestamps, or UTC-aware ones
+    when local is False
+    """
+    if is_legacy_csv(path):
+        df = normalize_legacy(pd.read_csv(path, dtype=str))
+        if not local:
+            df["timestamp"] = to_utc(df["timestamp"])
+        return df
+    # The pyarrow engine parses the fixed ISO-8601 layout natively; the
+    # explicit format is the fallback if a column comes back as text.
+    df = pd.read_csv(path, dtype=CSV_DTYPES, engine="pyarrow")
+    if not isinstance(df["timestamp"].dtype, pd.DatetimeTZDtype):
+        df["timestamp"] = pd.to_datetime(
+            df["timestamp"], format=TIMESTAMP_FORMAT, utc=True, errors="coerce"
+        )
+    df["timestamp"] = _to_local(df["timestamp"]) if local else df["timestamp"].dt.tz_convert("UTC")
+    return _finalize(df)
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS, columns=None):
+    """
+    Yields a log file (parquet day, CSV part or legacy CSV) as frames of
+    at most chunk_rows rows with the same dtypes as the full readers.
+    With columns, only those are parsed and the rest come back as NA.
+    """
+    path = Path(path)
+    wanted = None if columns is None else {"timestamp", *columns}
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        if wanted is not None:
+            wanted = [name for name in parquet.schema_arrow.names if name in wanted]
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=wanted):
+            df = batch.to_pandas()
+            df["timestamp"] = _to_local(df["timestamp"])
+            yield _finalize(df)
+        return
+    if is_legacy_csv(path):
+        for df in pd.read_csv(path, dtype=str, chunksize=chunk_rows):
+            yield normalize_legacy(df)
+        return
+    dtypes = dict(CSV_DTYPES, timestamp=str)
+    usecols = None if wanted is None else (lambda name: name in wanted)
+    for df in pd.read_csv(path, dtype=dtypes, usecols=usecols, chunksize=chunk_rows):
+        df["timestamp"] = parse_timestamps(df["timestamp"])
+        yield _finalize(df)
+
+
+def concat_frames(frames):
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return empty_frame()
+    # Categories differ between parts; re-apply them once after joining.
+    return _finalize(pd.concat(frames, ignore_index=True))
+
+
+def read_day(entry, local=True):
+    """
+    Reads a day partition with naive local timestamps, or UTC-aware ones
+    when local is False (for rewriting it without a round trip through
+    local time)
+    """
+    frames = []
+    if entry["parquet"] is not None:
+        df = pd.read_parquet(entry["parquet"])
+        df["timestamp"] = _to_local(df["timestamp"]) if local else to_utc(df["timestamp"])
+        frames.append(df)
+    frames.extend(read_csv_part(path, local) for path in entry["csv"])
+    return concat_frames(frames)
+
+
+def read_legacy():
+    return normalize_legacy(pd.read_csv(LOG_FILE, dtype=str))
+
+
+def write_day(day, df):
+    """
+    Writes a full day as a zstd parquet file (timestamps stored in UTC)
+    and returns its path. Naive timestamps are taken as local time.
+    """
+    df = df.assign(timestamp=to_utc(df["timestamp"])).sort_values("timestamp", kind="stable")
+    target = LOG_DIR / f"violations-{day.isoformat()}.parquet"
+    tmp = target.with_name(target.name + ".tmp")
+    df.to_parquet(tmp, index=False, compression="zstd")
+    os.replace(tmp, target)
+    return target
+
+
+def compact_partitions(today=None):
+    """
+    Folds the CSV parts of every closed day into one zstd-compressed
+    parquet file. Safe to run from several processes at once.
+    """
+    today = today or date.today()
+    cutoff = time.time() - COMPACT_GRACE_SECONDS
+    compacted = []
+    for day, entry in sorted(list_partitions().items()):
+        if day >= today or not entry["csv"]:
+            continue
+        try:
+            if any(path.stat().st_mtime > cutoff for path in entry["csv"]):
+                continue
+        except FileNotFoundError:
+            continue
+
+        compacted.append(write_day(day, read_day(entry, local=False)))
+        for path in entry["csv"]:
+            path.unlink(missing_ok=True)
+    return compacted
+
+
+def _select_sources(start, end, include_legacy):
+    entries = [
+        (day, entry)
+        for day, entry in sorted(list_partitions().items())
+        if (start is None or day >= start.date()) and (end is None or day <= end.date())
+    ]
+    # The pre-partition log is only read when it could hold rows in range;
+    # migrate_logs.py retires it.
+    legacy = include_legacy and LOG_FILE.exists()
+    if legacy and start is not None:
+        legacy = LOG_FILE.stat().st_mtime >= start.to_pydatetime().timestamp()
+    return entries, legacy
+
+
+def source_files(start=None, end=None, include_legacy=True):
+    """
+    Lists the files query_violations would read for [start, end], so
+    callers can tell from their mtimes whether a result has changed
+    """
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    entries, legacy = _select_sources(start, end, include_legacy)
+    files = []
+    for _day, entry in entries:
+        if entry["parquet"] is not None:
+            files.append(entry["parquet"])
+        files.extend(entry["csv"])
+    if legacy:
+        files.append(LOG_FILE)
+    return files
+
+
+def _tag_source(df, source):
+    return df.assign(source=source, row=np.arange(len(df), dtype=np.int64))
+
+
+def query_violations(start=None, end=None, include_legacy=True, with_source=False):
+    """
+    Loads violations in [start, end], opening only the day partitions
+    that overlap the range. with_source adds the SOURCE_COLUMNS.
+    """
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+
+    entries, legacy = _select_sources(start, end, include_legacy)
+    frames = []
+    for day, entry in entries:
+        df = read_day(entry)
+        frames.append(_tag_source(df, day.isoformat()) if with_source else df)
+    if legacy:
+        df = read_legacy()
+        frames.append(_tag_source(df, LOG_FILE.name) if with_source else df)
+
+    df = concat_frames(frames)
+    if with_source and "source" not in df.columns:
+        df = _tag_source(df, "")
+    if start is not None:
+        df = df[df["timestamp"] >= start]
+    if end is not None:
+        df = df[df["timestamp"] <= end]
+    return df.sort_values("timestamp", kind="stable").reset_index(drop=True)
@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Capture-to-X spans inference, confirmation streaks and network writes,
+# so the buckets reach further than the per-stage ones.
+CAPTURE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.35, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0, 30.0)
+CAPTURE_STAGES = ("detect", "encode", "send", "log", "onset_to_log")
+WINDOW = 512
+
+
+class CaptureLatency:
+    """
+    Time from frame capture to each point a frame reaches, per camera.
+
+    Every sample goes to the Prometheus histogram (when given) and to a
+    bounded window per stage that snapshot() summarises for /status.
+    Timestamps are epoch seconds so they can also be compared with a
+    client's clock.
+    """
+
+    def __init__(self, camera_id, histogram=None, stages=CAPTURE_STAGES, window=WINDOW):
+        self.camera_id = camera_id
+        self._lock = threading.Lock()
+        self._windows = {stage: deque(maxlen=window) for stage in stages}
+        self._children = {}
+        if histogram is not None:
+            self._children = {stage: histogram.labels(camera_id, stage) for stage in stages}
+
+    def observe(self, stage, captured_at, now=None):
+        if captured_at is None:
+            return
+        seconds = max(0.0, (now if now is not None else time.time()) - captured_at)
+        child = self._children.get(stage)
+        if child is not None:
+            child.observe(seconds)
+        with self._lock:
+            self._windows[stage].append(seconds)
+
+    def snapshot(self):
+        """
+        Returns {stage: {count, p50_ms, p95_ms, p99_ms, max_ms}} over
+        the recent window
+        """
+        with self._lock:
+            windows = {stage: np.array(values) for stage, values in self._windows.items()}
+        report = {}
+        for stage, values in windows.items():
+            if not len(values):
+                report[stage] = {"count": 0}
+                continue
+            p50, p95, p99 = np.percentile(values, (50, 95, 99)) * 1000
+            report[stage] = {
+                "count": len(values),
+                "p50_ms": round(float(p50), 1),
+                "p95_ms": round(float(p95), 1),
+                "p99_ms": round(float(p99), 1),
+                "max_ms": round(float(values.max()) * 1000, 1),
+            }
+        return report
@@ -1,34 +1,137 @@
 import csv
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 LOG_FILE = BASE_DIR / "logs" / "violations.csv"
+LOG_DIR = BASE_DIR / "logs" / "history"
+LOG_HEADER = [
+    "timestamp",
+    "camera_id",
+    "event_id",
+    "violation",
+    "severity",
+    "zone",
+    "bbox_x1",
+    "bbox_y1",
+    "bbox_x2",
+    "bbox_y2",
+    "clip",
+    "frame_id",
+    "capture_to_log_ms",
+]
+MAX_PARTITION_BYTES = 32 * 1024 * 1024
+# Retries for closed days whose last writes were too recent to compact.
+COMPACT_RETRIES = 3
 
-def log_violation(camera_id, violations, severity):
+_last_day = None
+# Parts already known to carry LOG_HEADER; a header never changes once
+# written, so each part is read at most once per process.
+_current_header_parts = set()
+
+
+def partition_path(day, part=0):
+    suffix = f".{part}" if part else ""
+    return LOG_DIR / f"violations-{day.isoformat()}{suffix}.csv"
+
+
+def _header_matches(path):
+    if path in _current_header_parts:
+        return True
+    with path.open(newline="") as f:
+        matches = next(csv.reader(f), None) == LOG_HEADER
+    if matches:
+        _current_header_parts.add(path)
+    return matches
+
+
+def _active_partition(day):
     """
-    Logs safety violations to CSV file
+    Returns the CSV part to append to for a day, moving to the next part
+    once the current one passes MAX_PARTITION_BYTES or was written with
+    an older header
     """
+    part = 0
+    path = partition_path(day, part)
+    while path.exists() and (
+        path.stat().st_size >= MAX_PARTITION_BYTES or not _header_matches(path)
+    ):
+        part += 1
+        path = partition_path(day, part)
+    return path
+
 
-    LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
-    file_exists = LOG_FILE.exists()
+def _compact_closed_partitions(retries=COMPACT_RETRIES):
+    """
+    Compacts closed days. A day written to shortly before midnight is
+    still inside the grace period at the first write of the next day, so
+    while closed days keep CSV parts, another pass is scheduled once the
+    grace period has passed.
+    """
+    from logic.history import COMPACT_GRACE_SECONDS, compact_partitions, list_partitions
 
-    with LOG_FILE.open(mode="a", newline="") as f:
+    try:
+        compact_partitions()
+    except Exception as exc:
+        print(f"Log compaction failed: {exc}")
+        return
+    today = datetime.now().date()
+    deferred = any(
+        entry["csv"] for day, entry in list_partitions().items() if day < today
+    )
+    if deferred and retries > 0:
+        timer = threading.Timer(
+            COMPACT_GRACE_SECONDS + 1, _compact_closed_partitions, args=(retries - 1,)
+        )
+        timer.daemon = True
+        timer.start()
+
+
+def log_violation(camera_id, violations, clip_path=None, frame_id=None, captured_at=None):
+    """
+    Logs safety violations to the daily CSV partition, one row per
+    violation with an ISO-8601 timestamp including the UTC offset.
+    frame_id and captured_at (epoch seconds) identify the frame that
+    confirmed the event; the row records capture-to-log time from it.
+    """
+    global _last_day
+
+    now = datetime.now().astimezone()
+    day = now.date()
+    if _last_day != day:
+        # First write of the process or of a new day: compact closed days
+        # off the frame loop.
+        _last_day = day
+        threading.Thread(target=_compact_closed_partitions, daemon=True).start()
+
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    path = _active_partition(day)
+    file_exists = path.exists()
+    timestamp = now.isoformat(timespec="seconds")
+    capture_to_log_ms = ""
+    if captured_at is not None:
+        capture_to_log_ms = round((time.time() - captured_at) * 1000)
+
+    with path.open(mode="a", newline="") as f:
         writer = csv.writer(f)
 
         # Write header once
         if not file_exists:
+            writer.writerow(LOG_HEADER)
+            _current_header_parts.add(path)
+
+        for sev, violation, _reason, event_id, bbox, zone in violations:
             writer.writerow([
-                "timestamp",
-                "camera_id",
-                "violations",
-                "severity"
+                timestamp,
+                camera_id,
+                event_id,
+                violation,
+                sev,
+                zone,
+                *bbox,
+                clip_path or "",
+                "" if frame_id is None else frame_id,
+                capture_to_log_ms,
             ])
-        
-
-        writer.writerow([
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            camera_id,
-            ", ".join([v[1] for v in violations]),
-            severity
-        ])
@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from logic.perception import _class_groups, run_detector
+
+WARMUP_RUNS = 2
+WATCH_INTERVAL = 2.0
+
+
+def load_yolo(path):
+    from ultralytics import YOLO
+
+    return YOLO(str(path))
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def check_class_map(model, reference=None):
+    """
+    Returns None when model can drive the rules, else the reason it
+    cannot. With a reference model, every role the reference detects
+    (person, helmet, harness) must also be detectable by the new one.
+    """
+    groups = _class_groups(model)
+    roles = ("person", "helmet", "harness")
+    if not groups[0]:
+        return f"no person class in {model.names}"
+    if reference is not None:
+        for role, new_ids, old_ids in zip(roles, groups, _class_groups(reference)):
+            if old_ids and not new_ids:
+                return f"no {role} class in {model.names}"
+    return None
+
+
+class ModelRegistry:
+    """
+    Loads replacement models off the frame thread and hands them over
+    between frames.
+
+    load() (or the file watcher, when watch_interval is set) loads the
+    file on a background thread, checks its class map against the active
+    model and runs warmup_runs inferences on a blank frame at each of
+    warmup_imgsz. A model that passes is staged; the frame loop calls
+    take_pending() once per frame and switches to it there, so a frame
+    never sees two models. The replaced model stays loaded for rollback().
+    """
+
+    def __init__(
+        self,
+        model,
+        path,
+        loader=load_yolo,
+        warmup_imgsz=(640,),
+        warmup_runs=WARMUP_RUNS,
+        watch_interval=None,
+        on_result=None,
+    ):
+        self.loader = loader
+        self.warmup_imgsz = tuple(warmup_imgsz)
+        self.warmup_runs = warmup_runs
+        self.watch_interval = watch_interval
+        self.on_result = on_result
+        self._lock = threading.Lock()
+        self._active = (model, str(path), time.time())
+        self._previous = None
+        self._pending = None
+        self._loading = None
+        self._last_error = None
+        self._swaps = 0
+        self._watched = Path(path)
+        self._stamp = _file_stamp(self._watched)
+        self._stop = threading.Event()
+        self._watcher = None
+        if watch_interval:
+            self._watcher = threading.Thread(
+                target=self._watch, name="model-watch", daemon=True
+            )
+            self._watcher.start()
+
+    def _report(self, result):
+        if self.on_result is not None:
+            self.on_result(result)
+
+    def load(self, path):
+        """
+        Starts loading path in the background. Returns False if a load is
+        already running.
+        """
+        path = str(path)
+        with self._lock:
+            if self._loading is not None:
+                return False
+            self._loading = path
+        threading.Thread(
+            target=self._load, args=(path,), name="model-load", daemon=True
+        ).start()
+        return True
+
+    def _load(self, path):
+        try:
+            started = time.perf_counter()
+            model = self.loader(path)
+            reason = check_class_map(model, self._active[0])
+            if reason is not None:
+                self._fail(path, f"rejected: {reason}", "rejected")
+                return
+            blank = np.zeros((480, 640, 3), dtype=np.uint8)
+            for imgsz in self.warmup_imgsz:
+                for _ in range(self.warmup_runs):
+                    run_detector(blank, model, imgsz=imgsz)
+            with self._lock:
+                self._pending = (model, path, time.time())
+                self._last_error = None
+            print(f"Model staged: {path} ({time.perf_counter() - started:.1f}s)")
+        except Exception as exc:
+            self._fail(path, f"load failed: {exc}", "failed")
+        finally:
+            with self._lock:
+                self._loading = None
+
+    def _fail(self, path, error, result):
+        with self._lock:
+            self._last_error = {"path": path, "error": error, "at": time.time()}
+        print(f"Model {path} {error}")
+        self._report(result)
+
+    def rollback(self):
+        """
+        Stages the previously active model. Returns False if there is none.
+        """
+        with self._lock:
+            if self._previous is None:
+                return False
+            self._pending = self._previous
+        return True
+
+    def take_pending(self):
+        """
+        Called by the frame loop between frames. Activates the staged
+        model and returns it, or returns None when nothing is staged.
+        """
+        if self._pending is None:
+            return None
+        with self._lock:
+            pending, self._pending = self._pending, None
+            if pending is None:
+                return None
+            rolled_back = self._previous is not None and pending[0] is self._previous[0]
+            self._previous, self._active = self._active, pending
+            self._swaps += 1
+        print(f"Model active: {pending[1]}")
+        self._report("rolled_back" if rolled_back else "swapped")
+        return pending[0]
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            stamp = _file_stamp(self._watched)
+            if stamp is None or stamp == self._stamp:
+                continue
+            # Wait one more interval so a file still being copied in is
+            # not loaded half-written.
+            if self._stop.wait(self.watch_interval) or _file_stamp(self._watched) != stamp:
+                continue
+            if self.load(self._watched):
+                self._stamp = stamp
+
+    def status(self):
+        with self._lock:
+            model, path, since = self._active
+            return {
+                "active": {"path": path, "since": since, "classes": model.names},
+                "previous": self._previous[1] if self._previous else None,
+                "pending": self._pending[1] if self._pending else None,
+                "loading": self._loading,
+                "last_error": self._last_error,
+                "swaps": self._swaps,
+            }
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=1.0)
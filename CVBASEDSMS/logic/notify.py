@@ -0,0 +1,363 @@
+import json
+import queue
+import random
+import smtplib
+import socket
+import threading
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from logic.rules import CRITICAL, WARNING
+
+SEVERITY_RANK = {"INFO": 0, WARNING: 1, CRITICAL: 2}
+MAX_EVENTS_PER_NOTIFICATION = 20
+_STOP = object()
+
+
+class WebhookSink:
+    def __init__(self, url, timeout=5.0):
+        self.name = "webhook"
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, notification):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(notification).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class SmtpSink:
+    def __init__(
+        self,
+        host,
+        port,
+        sender,
+        recipients,
+        username=None,
+        password=None,
+        starttls=True,
+        timeout=10.0,
+    ):
+        self.name = "smtp"
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def send(self, notification):
+        message = EmailMessage()
+        message["Subject"] = format_subject(notification)
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        message.set_content(format_text(notification))
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(message)
+
+
+class FileSink:
+    """
+    Appends one JSON line per notification
+    """
+
+    def __init__(self, path):
+        self.name = "file"
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def send(self, notification):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(notification) + "\n"
+        with self._lock, self.path.open("a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class SocketSink:
+    """
+    Sends one JSON line per notification over a fresh TCP connection
+    """
+
+    def __init__(self, host, port, timeout=5.0):
+        self.name = "socket"
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def send(self, notification):
+        line = json.dumps(notification) + "\n"
+        with socket.create_connection((self.host, self.port), timeout=self.timeout) as conn:
+            conn.sendall(line.encode("utf-8"))
+
+
+class MemorySink:
+    """
+    Keeps notifications in a list; fail_times makes the first sends raise
+    so retries can be exercised without a network
+    """
+
+    def __init__(self, fail_times=0):
+        self.name = "memory"
+        self.fail_times = fail_times
+        self.attempts = 0
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, notification):
+        with self._lock:
+            self.attempts += 1
+            if self.attempts <= self.fail_times:
+                raise ConnectionError("simulated sink failure")
+            self.sent.append(notification)
+
+
+def sink_from_spec(spec):
+    """
+    Builds a sink from a --notify value:
+    http(s)://host/path, file:PATH, tcp://host:port, memory or
+    smtp://[user:password@]host[:port]?from=ADDR&to=ADDR[,ADDR]
+    """
+    if spec == "memory":
+        return MemorySink()
+    if spec.startswith("file:"):
+        return FileSink(spec[len("file:"):])
+    url = urlsplit(spec)
+    if url.scheme in ("http", "https"):
+        return WebhookSink(spec)
+    if url.scheme == "tcp":
+        if not url.hostname or not url.port:
+            raise ValueError(f"tcp sink needs host and port: {spec}")
+        return SocketSink(url.hostname, url.port)
+    if url.scheme == "smtp":
+        query = parse_qs(url.query)
+        sender = query.get("from", [None])[0]
+        recipients = [r for value in query.get("to", []) for r in value.split(",") if r]
+        if not url.hostname or not sender or not recipients:
+            raise ValueError(f"smtp sink needs host, from and to: {spec}")
+        return SmtpSink(
+            url.hostname,
+            url.port or 587,
+            sender,
+            recipients,
+            username=unquote(url.username) if url.username else None,
+            password=unquote(url.password) if url.password else None,
+        )
+    raise ValueError(f"Unknown notification sink: {spec}")
+
+
+def format_subject(notification):
+    count = notification["count"]
+    noun = "violation" if count == 1 else "violations"
+    return f"[{notification['severity']}] {notification['camera_id']}: {count} {noun}"
+
+
+def format_text(notification):
+    lines = [format_subject(notification), ""]
+    for violation, count in sorted(notification["violations"].items()):
+        lines.append(f"{violation}: {count}")
+    lines.append("")
+    lines.append(f"First: {notification['first_at']}")
+    lines.append(f"Last: {notification['last_at']}")
+    for event in notification["events"]:
+        if event.get("clip"):
+            lines.append(f"Clip: {event['clip']}")
+    return "\n".join(lines)
+
+
+def _notification(camera_id, severity, kind, bucket):
+    events = bucket["events"]
+    return {
+        "camera_id": camera_id,
+        "severity": severity,
+        "kind": kind,
+        "count": bucket["count"],
+        "violations": dict(bucket["violations"]),
+        "first_at": bucket["first_at"],
+        "last_at": bucket["last_at"],
+        "events": events,
+    }
+
+
+def _new_bucket():
+    return {"count": 0, "violations": Counter(), "events": [], "first_at": None, "last_at": None}
+
+
+def _add_event(bucket, event):
+    bucket["count"] += 1
+    bucket["violations"][event.get("violation")] += 1
+    if len(bucket["events"]) < MAX_EVENTS_PER_NOTIFICATION:
+        bucket["events"].append(event)
+    bucket["first_at"] = bucket["first_at"] or event.get("timestamp")
+    bucket["last_at"] = event.get("timestamp")
+
+
+class AlertDispatcher:
+    """
+    Sends violation notifications off the frame loop.
+
+    submit() only enqueues and drops when the queue is full. A coordinator
+    thread coalesces per (camera, severity): the first event is sent at
+    once and opens a window; events inside the window are folded into a
+    single summary sent when it closes. Deliveries run on a bounded pool
+    and retry each sink with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        sinks,
+        window_seconds=60.0,
+        min_severity=WARNING,
+        max_workers=2,
+        max_queued=1024,
+        max_attempts=5,
+        base_delay=1.0,
+        max_delay=60.0,
+        on_sent=None,
+        on_failed=None,
+        on_dropped=None,
+    ):
+        self.sinks = list(sinks)
+        self.window_seconds = window_seconds
+        self.min_rank = SEVERITY_RANK[min_severity]
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+        self.on_dropped = on_dropped
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._windows = {}
+        self._stopping = threading.Event()
+        self._deadline = None
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="notify")
+        # One delivery in flight per worker plus one waiting; beyond that
+        # the coordinator blocks and submit() starts dropping.
+        self._slots = threading.BoundedSemaphore(max_workers * 2)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, camera_id, severity, event):
+        if SEVERITY_RANK.get(severity, 0) < self.min_rank:
+            return False
+        try:
+            self._queue.put_nowait((camera_id, severity, event))
+        except queue.Full:
+            if self.on_dropped is not None:
+                self.on_dropped()
+            return False
+        return True
+
+    def close(self, timeout=10.0):
+        """
+        Sends pending summaries and waits up to timeout for deliveries.
+        Retries that would start after the timeout are given up and
+        reported through on_failed.
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        self._deadline = deadline
+        self._stopping.set()
+        self._pool.shutdown(wait=True)
+
+    def _wait_retry(self, seconds):
+        """
+        Sleeps before a retry. Returns False when close() has been called
+        and the retry would start after its deadline.
+        """
+        until = time.monotonic() + seconds
+        if not self._stopping.wait(seconds):
+            return True
+        if until > self._deadline:
+            return False
+        time.sleep(max(0.0, until - time.monotonic()))
+        return True
+
+    def _run(self):
+        while True:
+            deadlines = [window["until"] for window in self._windows.values()]
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._flush(force=True)
+                return
+            if item is not None:
+                self._add(*item)
+            self._flush()
+
+    def _add(self, camera_id, severity, event):
+        key = (camera_id, severity)
+        window = self._windows.get(key)
+        if window is None:
+            bucket = _new_bucket()
+            _add_event(bucket, event)
+            self._windows[key] = {
+                "until": time.monotonic() + self.window_seconds,
+                "bucket": _new_bucket(),
+            }
+            self._dispatch(_notification(camera_id, severity, "alert", bucket))
+        else:
+            _add_event(window["bucket"], event)
+
+    def _flush(self, force=False):
+        now = time.monotonic()
+        for key, window in list(self._windows.items()):
+            if not force and window["until"] > now:
+                continue
+            bucket = window["bucket"]
+            if bucket["count"] == 0:
+                del self._windows[key]
+                continue
+            self._dispatch(_notification(*key, "summary", bucket))
+            # Keep the window open while the burst continues.
+            window["bucket"] = _new_bucket()
+            window["until"] = now + self.window_seconds
+            if force:
+                del self._windows[key]
+
+    def _dispatch(self, notification):
+        self._slots.acquire()
+        future = self._pool.submit(self._deliver, notification)
+        future.add_done_callback(lambda _: self._slots.release())
+
+    def _deliver(self, notification):
+        for sink in self.sinks:
+            for attempt in range(self.max_attempts):
+                try:
+                    sink.send(notification)
+                except Exception as exc:
+                    delay = min(self.max_delay, self.base_delay * 2**attempt)
+                    if attempt + 1 == self.max_attempts:
+                        print(f"Notification via {sink.name} failed: {exc}")
+                    elif not self._wait_retry(delay * random.uniform(0.5, 1.0)):
+                        print(f"Notification via {sink.name} abandoned at shutdown: {exc}")
+                    else:
+                        continue
+                    if self.on_failed is not None:
+                        self.on_failed(sink.name)
+                    break
+                if self.on_sent is not None:
+                    self.on_sent(sink.name)
+                break
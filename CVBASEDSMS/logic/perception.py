@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def _to_bbox(xyxy):
     x1, y1, x2, y2 = map(int, xyxy)
     return (x1, y1, x2, y2)
@@ -31,7 +34,11 @@ def _normalize_name(name):
 
 
 def _class_groups(model):
-    names = model.names if isinstance(model.names, dict) else dict(enumerate(model.names))
+    return class_groups_from_names(model.names)
+
+
+def class_groups_from_names(names):
+    names = names if isinstance(names, dict) else dict(enumerate(names))
     normalized = {idx: _normalize_name(label) for idx, label in names.items()}
 
     person_keys = {"person", "worker", "man", "woman"}
@@ -51,17 +58,24 @@ def _class_groups(model):
     return person_ids, helmet_ids, harness_ids
 
 
-def _has_helmet(person_bbox, helmet_bboxes):
+def _helmet_conf(person_bbox, helmets):
+    """
+    Highest confidence of a helmet centred in the head region, 0.0 if none
+    """
     px1, py1, px2, py2 = person_bbox
     head_region = (px1, py1, px2, py1 + int(0.40 * (py2 - py1)))
-    for helmet_bbox in helmet_bboxes:
+    best = 0.0
+    for helmet_bbox, conf in helmets:
         c = _box_center(helmet_bbox)
         if _point_in_box(c, head_region):
-            return True
-    return False
+            best = max(best, conf)
+    return best
 
 
-def _has_harness(person_bbox, harness_bboxes):
+def _harness_conf(person_bbox, harnesses):
+    """
+    Highest confidence of a harness touching the torso region, 0.0 if none
+    """
     px1, py1, px2, py2 = person_bbox
     torso_region = (
         px1,
@@ -69,45 +83,87 @@ def _has_harness(person_bbox, harness_bboxes):
         px2,
         py1 + int(0.85 * (py2 - py1)),
     )
-    for harness_bbox in harness_bboxes:
+    best = 0.0
+    for harness_bbox, conf in harnesses:
         c = _box_center(harness_bbox)
-        if _point_in_box(c, torso_region):
-            return True
-        if _intersection_area(harness_bbox, torso_region) > 0:
-            return True
-    return False
-
-
-def detect_ppe(frame, model, conf=0.25):
-    results = model(frame, conf=conf)
-    boxes = results[0].boxes
-
-    person_ids, helmet_ids, harness_ids = _class_groups(model)
-
-    person_bboxes = []
-    helmet_bboxes = []
-    harness_bboxes = []
-
-    for box in boxes:
-        cls = int(box.cls[0])
-        bbox = _to_bbox(box.xyxy[0])
+        if _point_in_box(c, torso_region) or _intersection_area(harness_bbox, torso_region) > 0:
+            best = max(best, conf)
+    return best
+
+
+def result_rows(result):
+    """
+    Converts one ultralytics result to an (N, 6) float32 array of
+    x1, y1, x2, y2, confidence, class
+    """
+    boxes = result.boxes
+    if len(boxes) == 0:
+        return np.zeros((0, 6), dtype=np.float32)
+    return np.column_stack(
+        [
+            boxes.xyxy.cpu().numpy(),
+            boxes.conf.cpu().numpy(),
+            boxes.cls.cpu().numpy(),
+        ]
+    ).astype(np.float32)
+
+
+def run_detector(frame, model, conf=0.25, imgsz=None, classes=None):
+    """
+    Returns raw detections as an (N, 6) float32 array of
+    x1, y1, x2, y2, confidence, class
+    """
+    kwargs = {"conf": conf}
+    if imgsz is not None:
+        kwargs["imgsz"] = imgsz
+    if classes is not None:
+        kwargs["classes"] = classes
+    results = model(frame, **kwargs)
+    return result_rows(results[0])
+
+
+def associate_persons(detections, class_groups):
+    """
+    Matches helmets and harnesses to persons. Each person carries the
+    detector confidence of the person box and of its best-matching PPE
+    (0.0 when none matched) for confidence-weighted event confirmation.
+    """
+    person_ids, helmet_ids, harness_ids = class_groups
+
+    person_boxes = []
+    helmet_boxes = []
+    harness_boxes = []
+
+    for row in detections:
+        cls = int(row[5])
+        box = (_to_bbox(row[:4]), float(row[4]))
 
         if cls in person_ids:
-            person_bboxes.append(bbox)
+            person_boxes.append(box)
         elif cls in helmet_ids:
-            helmet_bboxes.append(bbox)
+            helmet_boxes.append(box)
         elif cls in harness_ids:
-            harness_bboxes.append(bbox)
+            harness_boxes.append(box)
 
     persons = []
-    for i, person_bbox in enumerate(person_bboxes):
+    for i, (person_bbox, conf) in enumerate(person_boxes):
+        helmet_conf = _helmet_conf(person_bbox, helmet_boxes)
+        harness_conf = _harness_conf(person_bbox, harness_boxes)
         persons.append(
             {
                 "person_id": i,
-                "helmet": _has_helmet(person_bbox, helmet_bboxes),
-                "harness": _has_harness(person_bbox, harness_bboxes),
+                "helmet": helmet_conf > 0,
+                "harness": harness_conf > 0,
                 "bbox": person_bbox,
+                "conf": conf,
+                "helmet_conf": helmet_conf,
+                "harness_conf": harness_conf,
             }
         )
 
     return persons
+
+
+def detect_ppe(frame, model, conf=0.25, imgsz=None):
+    detections = run_detector(frame, model, conf=conf, imgsz=imgsz)
+    return associate_persons(detections, _class_groups(model))
@@ -1,3 +1,4 @@
+import time
 from pathlib import Path
 
 import cv2
@@ -5,8 +6,9 @@ from ultralytics import YOLO
 
 from logic.alerts import decide_alert_action
 from logic.context import get_person_zone, is_person_at_height
-from logic.perception import detect_ppe
-from logic.rules import evaluate_ppe_rules
+from logic import trace
+from logic.perception import associate_persons, class_groups_from_names, run_detector
+from logic.rules import evaluate_ppe_rules, required_ppe
 
 
 BASE_DIR = Path(__file__).resolve().parents[1]
@@ -23,6 +25,14 @@ def get_model():
     return _MODEL
 
 
+def set_model(model):
+    """
+    Replaces the detector get_model() returns, e.g. with a StubDetector
+    """
+    global _MODEL
+    _MODEL = model
+
+
 def build_contextual_reason(violation, zone, at_height):
     reasons = []
     if violation == "NO_HELMET":
@@ -43,10 +53,77 @@ def _event_id_for_person_violation(person_bbox, zone, violation):
     return f"{violation}:{zone}:{qcx}:{qcy}"
 
 
-def process_frame(frame):
+def analyze_frame(frame, timings=None, imgsz=None, detector=None):
+    """
+    Detection and rules only. detector, if given, replaces the full-frame
+    pass (e.g. a CascadeDetector) and must return run_detector's layout.
+    """
     model = get_model()
     h, w, _ = frame.shape
+
+    detect_started = time.perf_counter()
+    with trace.span("detect"):
+        if detector is not None:
+            detections = detector(frame, imgsz=imgsz)
+        else:
+            detections = run_detector(frame, model, imgsz=imgsz)
+    with trace.span("associate"):
+        persons = associate_persons(detections, class_groups_from_names(model.names))
+    if timings is not None:
+        timings["inference"] = time.perf_counter() - detect_started
+
+    with trace.span("rules"):
+        alert, all_violations = evaluate_persons(persons, w, h)
+    return persons, alert, all_violations
+
+
+def evaluate_persons(persons, w, h):
     all_violations = []
+    for person in persons:
+        zone = get_person_zone(person, w)
+        at_height = is_person_at_height(person["bbox"], h)
+        violations = evaluate_ppe_rules(person, zone, at_height)
+        for sev, violation in violations:
+            reason = build_contextual_reason(violation, zone, at_height)
+            event_id = _event_id_for_person_violation(person["bbox"], zone, violation)
+            all_violations.append((sev, violation, reason, event_id, person["bbox"], zone))
+
+    alert = decide_alert_action(all_violations)
+    return alert, all_violations
+
+
+def violation_evidence(persons, w, h):
+    """
+    Maps event ids to this frame's evidence for event confirmation: the
+    person's confidence when required PPE is missing, or minus person
+    times PPE confidence when it is seen, so a worker whose helmet flickers
+    in and out of detection does not build up to an alert
+    """
+    evidence = {}
+    for person in persons:
+        zone = get_person_zone(person, w)
+        at_height = is_person_at_height(person["bbox"], h)
+        conf = person.get("conf", 1.0)
+        for _sev, violation, ppe in required_ppe(zone, at_height):
+            event_id = _event_id_for_person_violation(person["bbox"], zone, violation)
+            if person[ppe]:
+                value = -conf * person.get(f"{ppe}_conf", 1.0)
+            else:
+                value = conf
+            # Overlapping persons can share a cell; a violation outranks
+            # a compliant neighbour.
+            current = evidence.get(event_id)
+            if (
+                current is None
+                or (value > 0 and value > current)
+                or (current < 0 and value < current)
+            ):
+                evidence[event_id] = value
+    return evidence
+
+
+def render_frame(frame, persons, alert, all_violations):
+    h, w, _ = frame.shape
 
     overlay = frame.copy()
     cv2.rectangle(overlay, (0, 0), (int(0.6 * w), h), (0, 255, 0), -1)
@@ -73,19 +150,6 @@ def process_frame(frame):
         2,
     )
 
-    persons = detect_ppe(frame, model)
-
-    for person in persons:
-        zone = get_person_zone(person, w)
-        at_height = is_person_at_height(person["bbox"], h)
-        violations = evaluate_ppe_rules(person, zone, at_height)
-        for sev, violation in violations:
-            reason = build_contextual_reason(violation, zone, at_height)
-            event_id = _event_id_for_person_violation(person["bbox"], zone, violation)
-            all_violations.append((sev, violation, reason, event_id))
-
-    alert = decide_alert_action(all_violations)
-
     for person in persons:
         x1, y1, x2, y2 = person["bbox"]
         color = (0, 255, 0)
@@ -127,4 +191,15 @@ def process_frame(frame):
         2,
     )
 
+    return frame
+
+
+def process_frame(frame, timings=None):
+    persons, alert, all_violations = analyze_frame(frame, timings)
+
+    render_started = time.perf_counter()
+    frame = render_frame(frame, persons, alert, all_violations)
+    if timings is not None:
+        timings["annotate"] = time.perf_counter() - render_started
+
     return frame, alert, all_violations
@@ -0,0 +1,328 @@
+import csv
+import html
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from logic.history import CHUNK_ROWS, iter_chunks, list_partitions
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+LOG_ROOT = BASE_DIR / "logs"
+REPORT_FILE = LOG_ROOT / "compliance_report.csv"
+# Shift name -> start hour; a shift runs until the next one starts, and
+# the last one wraps past midnight onto the date it started.
+SHIFTS = {"day": 6, "evening": 14, "night": 22}
+PERIODS = ("shift", "day", "week")
+TOP_N = 10
+COUNT_FIELDS = ["period", "camera_id", "violation", "severity", "count"]
+HOUR_FIELDS = ["camera_id", "hour", "count"]
+# Only these log columns are parsed; bbox and clip columns are skipped.
+READ_COLUMNS = ["camera_id", "event_id", "violation", "severity"]
+HOTSPOT_FIELDS = ["camera_id", "event_id", "violation", "zone", "cell_x", "cell_y", "count"]
+
+
+def parse_shifts(spec):
+    """
+    Parses "day=6,evening=14,night=22" into {name: start_hour}
+    """
+    shifts = {}
+    for item in spec.split(","):
+        name, _, hour = item.partition("=")
+        hour = int(hour)
+        if not name or not 0 <= hour < 24:
+            raise ValueError(f"Bad shift: {item}")
+        shifts[name.strip()] = hour
+    return dict(sorted(shifts.items(), key=lambda item: item[1]))
+
+
+def parse_end(value):
+    """
+    Parses an inclusive end bound; a bare date such as "2026-10-31"
+    covers that whole day instead of stopping at its midnight
+    """
+    if value is None:
+        return None
+    end = pd.Timestamp(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        date_only = True
+    else:
+        date_only = isinstance(value, str) and len(value.strip()) == 10
+    if date_only:
+        end = end + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+    return end
+
+
+def period_keys(timestamps, period, shifts=SHIFTS):
+    """
+    Labels each timestamp with its reporting period: "2026-10-19 night",
+    "2026-10-19" or "2026-W43". Days and weeks start with the first shift.
+    """
+    names = np.array(list(shifts))
+    starts = np.array(list(shifts.values()))
+    shifted = timestamps - pd.Timedelta(hours=int(starts[0]))
+    days = shifted.dt.strftime("%Y-%m-%d")
+    if period == "day":
+        return days
+    if period == "week":
+        return shifted.dt.strftime("%G-W%V")
+    index = np.searchsorted(starts - starts[0], shifted.dt.hour.to_numpy(), side="right") - 1
+    return days + " " + names[index]
+
+
+class ComplianceAggregator:
+    """
+    Single-pass counters over violation rows. Memory grows with the number
+    of distinct periods, cameras and event cells, not with rows, and two
+    aggregators merge by adding their counters, so files can be summed
+    in separate processes.
+    """
+
+    def __init__(self, period="shift", shifts=SHIFTS, start=None, end=None):
+        self.period = period
+        self.shifts = shifts
+        self.start = start
+        self.end = end
+        self.counts = Counter()
+        self.hours = Counter()
+        self.hotspots = Counter()
+        self.rows = 0
+        self.first = None
+        self.last = None
+
+    def add(self, df):
+        if self.start is not None:
+            df = df[df["timestamp"] >= self.start]
+        if self.end is not None:
+            df = df[df["timestamp"] <= self.end]
+        if df.empty:
+            return
+        self.rows += len(df)
+        first, last = df["timestamp"].min(), df["timestamp"].max()
+        self.first = first if self.first is None else min(self.first, first)
+        self.last = last if self.last is None else max(self.last, last)
+
+        keys = pd.DataFrame(
+            {
+                "period": period_keys(df["timestamp"], self.period, self.shifts),
+                "camera_id": df["camera_id"].astype(str),
+                "violation": df["violation"].astype(str),
+                "severity": df["severity"].astype(str),
+                "hour": df["timestamp"].dt.hour,
+                "event_id": df["event_id"],
+            }
+        )
+        self.counts.update(
+            keys.groupby(["period", "camera_id", "violation", "severity"]).size().to_dict()
+        )
+        self.hours.update(keys.groupby(["camera_id", "hour"]).size().to_dict())
+        # Legacy rows have no event id and so no location.
+        located = keys[keys["event_id"] != ""]
+        self.hotspots.update(located.groupby(["camera_id", "event_id"]).size().to_dict())
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.hours.update(other.hours)
+        self.hotspots.update(other.hotspots)
+        self.rows += other.rows
+        for value in (other.first, other.last):
+            if value is None:
+                continue
+            self.first = value if self.first is None else min(self.first, value)
+            self.last = value if self.last is None else max(self.last, value)
+        return self
+
+    def count_rows(self):
+        return [
+            dict(zip(COUNT_FIELDS, (*key, count)))
+            for key, count in sorted(self.counts.items())
+        ]
+
+    def worst_hours(self, top=TOP_N):
+        return [
+            {"camera_id": camera, "hour": f"{hour:02d}:00", "count": count}
+            for (camera, hour), count in self.hours.most_common(top)
+        ]
+
+    def repeat_hotspots(self, top=TOP_N):
+        rows = []
+        for (camera, event_id), count in self.hotspots.most_common():
+            if count < 2 or len(rows) >= top:
+                break
+            # Event ids are violation:zone:qcx:qcy with 20 px cells.
+            parts = event_id.split(":")
+            violation, zone, cell_x, cell_y = (parts + ["", "", "", ""])[:4]
+            rows.append(
+                {
+                    "camera_id": camera,
+                    "event_id": event_id,
+                    "violation": violation,
+                    "zone": zone,
+                    "cell_x": cell_x,
+                    "cell_y": cell_y,
+                    "count": count,
+                }
+            )
+        return rows
+
+
+def plan_sources(log_roots, start=None, end=None):
+    """
+    Lists the files to read from each log root (a directory holding
+    history/ and violations.csv, like logs/ or a stream_server --log_dir),
+    skipping day partitions outside [start, end]
+    """
+    files = []
+    for root in log_roots:
+        root = Path(root)
+        for day, entry in sorted(list_partitions(root / "history").items()):
+            if start is not None and day < start.date():
+                continue
+            if end is not None and day > end.date():
+                continue
+            if entry["parquet"] is not None:
+                files.append(entry["parquet"])
+            files.extend(entry["csv"])
+        legacy = root / "violations.csv"
+        if legacy.exists():
+            files.append(legacy)
+    return files
+
+
+def aggregate_file(job):
+    path, period, shifts, start, end, chunk_rows = job
+    aggregator = ComplianceAggregator(period, shifts, start, end)
+    started = time.perf_counter()
+    for chunk in iter_chunks(path, chunk_rows, READ_COLUMNS):
+        aggregator.add(chunk)
+    return str(path), aggregator, time.perf_counter() - started
+
+
+def _write_csv(path, fields, rows):
+    with path.open(mode="w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _html_table(fields, rows):
+    head = "".join(f"<th>{html.escape(field)}</th>" for field in fields)
+    body = "".join(
+        "<tr>" + "".join(f"<td>{html.escape(str(row[field]))}</td>" for field in fields) + "</tr>"
+        for row in rows
+    )
+    if not rows:
+        body = f'<tr><td colspan="{len(fields)}">None</td></tr>'
+    return f"<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+
+
+def _period_totals(aggregator):
+    totals = {}
+    for (period, camera, _violation, severity), count in aggregator.counts.items():
+        row = totals.setdefault(
+            (period, camera),
+            {"period": period, "camera_id": camera, "CRITICAL": 0, "WARNING": 0, "total": 0},
+        )
+        if severity in row:
+            row[severity] += count
+        row["total"] += count
+    return [totals[key] for key in sorted(totals)]
+
+
+def write_html(path, aggregator, sources, top=TOP_N):
+    period_rows = _period_totals(aggregator)
+    span = "no rows"
+    if aggregator.first is not None:
+        span = f"{aggregator.first:%Y-%m-%d %H:%M} to {aggregator.last:%Y-%m-%d %H:%M}"
+    document = f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Compliance report</title>
+<style>
+  body {{ font: 14px sans-serif; margin: 24px; color: #0f172a; }}
+  table {{ border-collapse: collapse; margin-bottom: 24px; }}
+  th, td {{ border-bottom: 1px solid #e5e7eb; padding: 6px 10px; text-align: left; }}
+  th {{ font-size: 11px; text-transform: uppercase; color: #64748b; }}
+</style>
+</head>
+<body>
+<h1>Compliance report</h1>
+<p>{aggregator.rows} violations, {html.escape(span)}, from {len(sources)} file(s).
+Generated {date.today().isoformat()}.</p>
+<h2>By {html.escape(aggregator.period)}</h2>
+{_html_table(["period", "camera_id", "CRITICAL", "WARNING", "total"], period_rows)}
+<h2>Worst hours of day</h2>
+{_html_table(HOUR_FIELDS, aggregator.worst_hours(top))}
+<h2>Repeat hotspots</h2>
+{_html_table(HOTSPOT_FIELDS, aggregator.repeat_hotspots(top))}
+<h2>Counts by violation and severity</h2>
+{_html_table(COUNT_FIELDS, aggregator.count_rows())}
+</body>
+</html>
+"""
+    path.write_text(document, encoding="utf-8")
+
+
+def run_report(
+    log_roots=(LOG_ROOT,),
+    report_path=None,
+    period="shift",
+    shifts=SHIFTS,
+    start=None,
+    end=None,
+    workers=None,
+    chunk_rows=CHUNK_ROWS,
+    top=TOP_N,
+):
+    """
+    Streams every log file in range through ComplianceAggregator, one
+    file per worker process, and writes the CSV tables and an HTML summary
+    """
+    report_path = Path(report_path) if report_path else REPORT_FILE
+    start = pd.Timestamp(start) if start is not None else None
+    end = parse_end(end)
+    sources = plan_sources(log_roots, start, end)
+    if not sources:
+        print(f"No violation logs found in {', '.join(str(r) for r in log_roots)}")
+        return 1
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(sources)))
+    jobs = [(path, period, shifts, start, end, chunk_rows) for path in sources]
+    started = time.perf_counter()
+    total = ComplianceAggregator(period, shifts, start, end)
+    if workers == 1:
+        results = map(aggregate_file, jobs)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(aggregate_file, jobs)
+    try:
+        for path, aggregator, seconds in results:
+            print(f"{path}: {aggregator.rows} rows in {seconds:.2f}s")
+            total.merge(aggregator)
+    finally:
+        if workers > 1:
+            pool.shutdown()
+    wall_seconds = time.perf_counter() - started
+
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    hours_path = report_path.with_suffix(".hours.csv")
+    hotspots_path = report_path.with_suffix(".hotspots.csv")
+    html_path = report_path.with_suffix(".html")
+    _write_csv(report_path, COUNT_FIELDS, total.count_rows())
+    _write_csv(hours_path, HOUR_FIELDS, total.worst_hours(top))
+    _write_csv(hotspots_path, HOTSPOT_FIELDS, total.repeat_hotspots(top))
+    write_html(html_path, total, sources, top)
+
+    print(
+        f"Aggregated {total.rows} violations from {len(sources)} file(s) in "
+        f"{wall_seconds:.1f}s ({workers} workers)"
+    )
+    for path in (report_path, hours_path, hotspots_path, html_path):
+        print(f"Report: {path}")
+    return 0
@@ -9,14 +9,27 @@ NO_HARNESS = "NO_HARNESS"
 WARNING = "WARNING"
 CRITICAL = "CRITICAL"
 
+def required_ppe(zone, at_height):
+    """
+    (severity, violation, ppe key) for each item this person must wear
+    """
+    required = []
+
+    if zone == HIGH_RISK:
+        required.append((WARNING, NO_HELMET, "helmet"))
+
+    if at_height:
+        required.append((CRITICAL, NO_HARNESS, "harness"))
+
+    return required
+
+
 def evaluate_ppe_rules(person, zone, at_height):
     violations = []
 
-    if zone == HIGH_RISK and not person["helmet"]:
-        violations.append((WARNING, NO_HELMET))
-
-    if at_height and not person["harness"]:
-        violations.append((CRITICAL, NO_HARNESS))
+    for sev, violation, ppe in required_ppe(zone, at_height):
+        if not person[ppe]:
+            violations.append((sev, violation))
 
     return violations
 
@@ -0,0 +1,95 @@
+import time
+
+import numpy as np
+
+STUB_NAMES = {0: "harness", 1: "helmet", 2: "person"}
+
+
+class _Array:
+    """
+    Mimics the tensor calls run_detector makes (.cpu().numpy())
+    """
+
+    __slots__ = ("array",)
+
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class _Boxes:
+    def __init__(self, rows):
+        self.xyxy = _Array(rows[:, :4])
+        self.conf = _Array(rows[:, 4])
+        self.cls = _Array(rows[:, 5])
+        self._count = len(rows)
+
+    def __len__(self):
+        return self._count
+
+
+class _Result:
+    def __init__(self, rows):
+        self.boxes = _Boxes(rows)
+
+
+class StubDetector:
+    """
+    Stands in for the YOLO model in load tests. Each image costs
+    latency_ms at imgsz 640, scaled with the input area like a letterboxed
+    YOLO pass, either sleeping (an accelerator doing the work) or keeping
+    a core busy with numpy (CPU inference). It returns workers walking
+    across the frame: even ones wear helmets and only the first wears a
+    harness, so both rules and event logging get exercised.
+    """
+
+    def __init__(self, latency_ms=30.0, persons=3, mode="sleep"):
+        if mode not in ("sleep", "cpu"):
+            raise ValueError(f"Unknown stub mode: {mode}")
+        self.names = dict(STUB_NAMES)
+        self.latency = latency_ms / 1000.0
+        self.persons = persons
+        self.mode = mode
+        self.calls = 0
+        self._scratch = np.random.default_rng(0).random((256, 256), dtype=np.float32)
+
+    def _spend(self, seconds):
+        if self.mode == "sleep":
+            time.sleep(seconds)
+            return
+        # numpy releases the GIL, like torch does for real inference.
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            self._scratch @ self._scratch
+
+    def _rows(self, w, h):
+        rows = []
+        pw, ph = w / 8.0, h / 3.0
+        for i in range(self.persons):
+            x1 = (self.calls * 4 + i * w / max(self.persons, 1)) % (w - pw)
+            y1 = h * 0.3
+            rows.append((x1, y1, x1 + pw, y1 + ph, 0.9, 2))
+            if i % 2 == 0:
+                rows.append((x1 + pw * 0.3, y1, x1 + pw * 0.7, y1 + ph * 0.2, 0.8, 1))
+            if i == 0:
+                rows.append((x1 + pw * 0.2, y1 + ph * 0.4, x1 + pw * 0.8, y1 + ph * 0.7, 0.7, 0))
+        return np.asarray(rows, dtype=np.float32).reshape(-1, 6)
+
+    def __call__(self, source, conf=0.25, imgsz=None, classes=None, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        self._spend(self.latency * len(frames) * ((imgsz or 640) / 640) ** 2)
+        results = []
+        for frame in frames:
+            h, w = frame.shape[:2]
+            rows = self._rows(w, h)
+            rows = rows[rows[:, 4] >= conf]
+            if classes is not None:
+                rows = rows[np.isin(rows[:, 5], classes)]
+            results.append(_Result(rows))
+        self.calls += 1
+        return results
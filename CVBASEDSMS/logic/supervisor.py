@@ -0,0 +1,81 @@
+import threading
+
+from logic.capture import STALE, LatestFrameReader
+
+
+class CameraSupervisor:
+    """
+    Owns one LatestFrameReader per camera and watches their health.
+
+    A worker whose grab() has been stuck longer than restart_after is
+    abandoned and replaced by a fresh one; the old thread exits on its own
+    once the capture call returns. Consumers go through read() so they
+    always reach the current worker.
+    """
+
+    def __init__(self, check_interval=1.0, restart_after=20.0, on_health=None, on_restart=None):
+        self.check_interval = check_interval
+        self.restart_after = restart_after
+        self.on_health = on_health
+        self.on_restart = on_restart
+        self._lock = threading.Lock()
+        self._cameras = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def add(self, camera_id, source, **reader_kwargs):
+        reader = LatestFrameReader(source, **reader_kwargs).start()
+        with self._lock:
+            self._cameras[camera_id] = {
+                "source": source,
+                "kwargs": reader_kwargs,
+                "reader": reader,
+                "restarts": 0,
+            }
+        return reader
+
+    def read(self, camera_id, timeout=1.0):
+        with self._lock:
+            reader = self._cameras[camera_id]["reader"]
+        return reader.read(timeout)
+
+    def health(self, camera_id=None):
+        with self._lock:
+            cameras = dict(self._cameras)
+        report = {}
+        for name, camera in cameras.items():
+            report[name] = dict(camera["reader"].health(), restarts=camera["restarts"])
+        if camera_id is not None:
+            return report.get(camera_id)
+        return report
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            readers = [camera["reader"] for camera in self._cameras.values()]
+        for reader in readers:
+            reader.stop()
+
+    def _restart(self, camera_id, camera):
+        print(f"[{camera_id}] capture worker stuck, starting a new one")
+        old = camera["reader"]
+        old.stop(timeout=0)
+        # Frame ids carry on from the old worker so they stay unique.
+        camera["reader"] = LatestFrameReader(
+            camera["source"], first_frame_id=old.next_frame_id, **camera["kwargs"]
+        ).start()
+        camera["restarts"] += 1
+        if self.on_restart is not None:
+            self.on_restart(camera_id)
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            with self._lock:
+                for camera_id, camera in self._cameras.items():
+                    health = camera["reader"].health()
+                    if health["state"] == STALE and health["frame_age"] > self.restart_after:
+                        self._restart(camera_id, camera)
+                        health = camera["reader"].health()
+                    if self.on_health is not None:
+                        self.on_health(camera_id, health)
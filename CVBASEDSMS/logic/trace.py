@@ -0,0 +1,194 @@
+import atexit
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+TRACE_FILE = BASE_DIR / "logs" / "trace.json"
+DEFAULT_CAPACITY = 200_000
+_NOOP = nullcontext()
+
+# Both stay None unless enable() is called; every hook below checks one
+# global and returns, so untraced runs pay a function call per span.
+_tracer = None
+_profile = None
+
+
+class Tracer:
+    """
+    Records complete ("X") spans into a bounded ring and writes them as
+    Chrome trace-event JSON, which Perfetto and chrome://tracing open
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.events = deque(maxlen=capacity)
+        self.pid = os.getpid()
+        self.thread_names = {}
+
+    def record(self, name, cat, started, ended, args):
+        tid = threading.get_native_id()
+        if tid not in self.thread_names:
+            self.thread_names[tid] = threading.current_thread().name
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": started * 1e6,
+            "dur": (ended - started) * 1e6,
+            "pid": self.pid,
+            "tid": tid,
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def to_json(self):
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+            for tid, name in list(self.thread_names.items())
+        ]
+        return json.dumps(
+            {"traceEvents": metadata + list(self.events), "displayTimeUnit": "ms"}
+        )
+
+    def dump(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(self.to_json())
+        print(f"Trace: {path} ({len(self.events)} spans)")
+        return path
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "cat", "args", "started")
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.cat, self.started, time.perf_counter(), self.args)
+        return False
+
+
+class ProfileWindow:
+    """
+    Runs cProfile on the thread that calls tick() for duration seconds,
+    starting delay seconds after creation, then writes a .prof file and
+    a cumulative-time summary next to it
+    """
+
+    def __init__(self, path, delay, duration):
+        self.path = Path(path)
+        self.starts_at = time.monotonic() + delay
+        self.ends_at = self.starts_at + duration
+        self.profiler = None
+        self.done = False
+
+    def tick(self):
+        if self.done:
+            return
+        now = time.monotonic()
+        if self.profiler is None:
+            if now >= self.starts_at:
+                self.profiler = cProfile.Profile()
+                self.profiler.enable()
+                print(f"Profiling for {self.ends_at - self.starts_at:.0f}s")
+        elif now >= self.ends_at:
+            self.profiler.disable()
+            self.done = True
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.profiler.dump_stats(self.path)
+            summary = io.StringIO()
+            pstats.Stats(self.profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+            self.path.with_suffix(".txt").write_text(summary.getvalue())
+            print(f"Profile: {self.path}")
+
+
+def enable(path, capacity=DEFAULT_CAPACITY, profile_after=None, profile_seconds=None):
+    """
+    Starts recording spans and dumps them to path at exit. With
+    profile_seconds, the frame loop is also profiled for that long,
+    profile_after seconds after start.
+    """
+    global _tracer, _profile
+    _tracer = Tracer(capacity)
+    path = Path(path)
+    atexit.register(_tracer.dump, path)
+    if profile_seconds:
+        _profile = ProfileWindow(path.with_suffix(".prof"), profile_after or 0.0, profile_seconds)
+    return _tracer
+
+
+def enabled():
+    return _tracer is not None
+
+
+def to_json():
+    return _tracer.to_json() if _tracer is not None else None
+
+
+def span(name, cat="frame", args=None):
+    if _tracer is None:
+        return _NOOP
+    return _Span(_tracer, name, cat, args)
+
+
+def profile_tick():
+    if _profile is not None:
+        _profile.tick()
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--trace",
+        nargs="?",
+        const=str(TRACE_FILE),
+        default=None,
+        metavar="PATH",
+        help="Record per-frame stage spans and write Chrome trace JSON at exit",
+    )
+    parser.add_argument(
+        "--trace_buffer",
+        type=int,
+        default=DEFAULT_CAPACITY,
+        help="Spans kept in memory; the oldest are dropped first",
+    )
+    parser.add_argument(
+        "--trace_profile",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="With --trace, also run cProfile on the frame loop for this long",
+    )
+    parser.add_argument(
+        "--trace_profile_after",
+        type=float,
+        default=10.0,
+        metavar="SECONDS",
+        help="Delay before the cProfile window starts",
+    )
+
+
+def enable_from_args(args):
+    if args.trace is None:
+        return None
+    return enable(
+        args.trace,
+        capacity=args.trace_buffer,
+        profile_after=args.trace_profile_after,
+        profile_seconds=args.trace_profile,
+    )
@@ -0,0 +1,277 @@
+import base64
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import parse_qs
+
+import pandas as pd
+
+from logic.history import LOCAL_TZ, SOURCE_COLUMNS, query_violations, source_files, to_utc
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+GZIP_MIN_BYTES = 512
+RESPONSE_CACHE_SIZE = 64
+# Newest first. Rows can tie on every logged column (legacy rows have
+# minute timestamps and no event id), so the key ends with the row's
+# source file and position there, which makes the cursor unique.
+KEY_COLUMNS = ["timestamp", "camera_id", "event_id", "violation", *SOURCE_COLUMNS]
+COUNT_COLUMNS = {"by_severity": "severity", "by_camera": "camera_id", "by_violation": "violation"}
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert(LOCAL_TZ).tz_localize(None)
+    return ts
+
+
+def encode_cursor(key):
+    ts, camera_id, event_id, violation, source, row = key
+    payload = json.dumps([ts.isoformat(), camera_id, event_id, violation, source, int(row)])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    ts, camera_id, event_id, violation, source, row = json.loads(
+        base64.urlsafe_b64decode(padded)
+    )
+    return pd.Timestamp(ts), str(camera_id), str(event_id), str(violation), str(source), int(row)
+
+
+def parse_query(query):
+    """
+    Reads start, end, camera, severity, limit and cursor from an
+    /api/violations query string. camera and severity may repeat or be
+    comma-separated. Raises ValueError on malformed values.
+    """
+    params = parse_qs(query)
+
+    def _one(name):
+        values = params.get(name)
+        return values[0] if values else None
+
+    def _many(name):
+        return sorted(
+            {item.strip() for value in params.get(name, []) for item in value.split(",")} - {""}
+        )
+
+    limit = int(_one("limit") or DEFAULT_LIMIT)
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    cursor = _one("cursor")
+    try:
+        cursor = decode_cursor(cursor) if cursor else None
+    except (TypeError, ValueError) as exc:
+        raise ValueError("invalid cursor") from exc
+
+    return {
+        "start": _parse_time(_one("start")),
+        "end": _parse_time(_one("end")),
+        "cameras": _many("camera"),
+        "severities": [s.upper() for s in _many("severity")],
+        "limit": limit,
+        "cursor": cursor,
+    }
+
+
+def _cache_key(params):
+    key = dict(params)
+    for name in ("start", "end"):
+        if key[name] is not None:
+            key[name] = key[name].isoformat()
+    if key["cursor"] is not None:
+        key["cursor"] = encode_cursor(key["cursor"])
+    return json.dumps(key, sort_keys=True)
+
+
+def _read_end(params):
+    cursor, end = params["cursor"], params["end"]
+    if cursor is not None and (end is None or cursor[0] < end):
+        return cursor[0]
+    return end
+
+
+def _before_cursor(keys, cursor):
+    """
+    Masks the rows whose key sorts strictly before cursor in KEY_COLUMNS
+    order, comparing column by column while the earlier ones tie
+    """
+    before = pd.Series(False, index=keys.index)
+    tied = pd.Series(True, index=keys.index)
+    for column, value in zip(KEY_COLUMNS, cursor):
+        before |= tied & (keys[column] < value)
+        tied &= keys[column] == value
+    return before
+
+
+def _counts(df):
+    counts = {"total": int(len(df))}
+    for name, column in COUNT_COLUMNS.items():
+        values = df[column].astype(str).value_counts()
+        counts[name] = {key: int(n) for key, n in values.items()}
+    return counts
+
+
+def _item(row):
+    bbox = None
+    if not pd.isna(row.bbox_x1):
+        bbox = [int(row.bbox_x1), int(row.bbox_y1), int(row.bbox_x2), int(row.bbox_y2)]
+    return {
+        "timestamp": row.timestamp.isoformat(timespec="seconds"),
+        "camera_id": str(row.camera_id),
+        "event_id": row.event_id or None,
+        "violation": str(row.violation),
+        "severity": str(row.severity),
+        "zone": str(row.zone) or None,
+        "bbox": bbox,
+        "clip": row.clip or None,
+        "frame_id": None if pd.isna(row.frame_id) else int(row.frame_id),
+        "capture_to_log_ms": (
+            None if pd.isna(row.capture_to_log_ms) else int(row.capture_to_log_ms)
+        ),
+    }
+
+
+def build_page(params):
+    """
+    Returns one page of violations, newest first. Aggregated counts cover
+    the whole filtered range and are only computed for the first page;
+    later pages narrow the read to partitions at or before the cursor.
+    """
+    cursor = params["cursor"]
+    df = query_violations(params["start"], _read_end(params), with_source=True)
+    if params["cameras"]:
+        df = df[df["camera_id"].isin(params["cameras"])]
+    if params["severities"]:
+        df = df[df["severity"].isin(params["severities"])]
+
+    page = {"items": [], "next_cursor": None}
+    if cursor is None:
+        page["counts"] = _counts(df)
+
+    keys = pd.DataFrame({column: df[column] for column in KEY_COLUMNS})
+    for column in KEY_COLUMNS[1:-1]:
+        keys[column] = keys[column].astype(str)
+    if cursor is not None:
+        keys = keys[_before_cursor(keys, cursor)]
+    keys = keys.sort_values(KEY_COLUMNS, ascending=False, kind="stable")
+
+    limit = params["limit"]
+    rows = df.loc[keys.index[:limit]]
+    # Stored times are naive local; send them with their UTC offset.
+    rows = rows.assign(timestamp=to_utc(rows["timestamp"]).dt.tz_convert(LOCAL_TZ))
+    page["items"] = [_item(row) for row in rows.itertuples(index=False)]
+    if len(keys) > limit:
+        last = keys.iloc[limit - 1]
+        page["next_cursor"] = encode_cursor(tuple(last[column] for column in KEY_COLUMNS))
+    return page
+
+
+def _accepts_gzip(value):
+    for part in (value or "").split(","):
+        coding, _, q = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return q.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def _not_modified(headers, etag, last_modified):
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag in tags or "*" in tags
+    if_modified_since = headers.get("If-Modified-Since")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(if_modified_since).timestamp() >= int(last_modified)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _error(status, message):
+    body = json.dumps({"error": message}).encode("utf-8")
+    return status, {"Content-Type": "application/json", "Cache-Control": "no-store"}, body
+
+
+class ViolationsApi:
+    """
+    Serves /api/violations. The ETag hashes the query together with the
+    name, mtime and size of every log file it reads, so a poll against
+    unchanged logs is answered with 304 without opening them, and recent
+    bodies are kept already serialized and gzipped.
+    """
+
+    def __init__(self, cache_size=RESPONSE_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    def _fingerprint(self, params):
+        stats = []
+        for path in source_files(params["start"], _read_end(params)):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # Compaction replaced it between listing and stat.
+                continue
+            stats.append((path.name, stat.st_mtime_ns, stat.st_size))
+        digest = hashlib.sha1(json.dumps([_cache_key(params), stats]).encode("utf-8"))
+        last_modified = max((mtime for _, mtime, _ in stats), default=0) / 1e9
+        return f'"{digest.hexdigest()[:24]}"', last_modified
+
+    def _body(self, etag, params):
+        with self._lock:
+            cached = self._cache.get(etag)
+            if cached is not None:
+                self._cache.move_to_end(etag)
+                return cached
+
+        body = json.dumps(build_page(params), separators=(",", ":")).encode("utf-8")
+        compressed = None
+        if len(body) >= GZIP_MIN_BYTES:
+            compressed = gzip.compress(body, compresslevel=6, mtime=0)
+        cached = (body, compressed)
+        with self._lock:
+            self._cache[etag] = cached
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return cached
+
+    def handle(self, query, headers):
+        """
+        Returns (status, headers, body) for one request
+        """
+        try:
+            params = parse_query(query)
+        except ValueError as exc:
+            return _error(400, str(exc))
+
+        base_etag, last_modified = self._fingerprint(params)
+        gzip_ok = _accepts_gzip(headers.get("Accept-Encoding"))
+        # gzip and identity bodies are different representations, so
+        # they must not share a strong validator.
+        etag = f'{base_etag[:-1]}-gzip"' if gzip_ok else base_etag
+        response_headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if last_modified:
+            response_headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+        if _not_modified(headers, etag, last_modified):
+            return 304, response_headers, b""
+
+        body, compressed = self._body(base_etag, params)
+        response_headers["Content-Type"] = "application/json"
+        if compressed is not None and gzip_ok:
+            response_headers["Content-Encoding"] = "gzip"
+            body = compressed
+        return 200, response_headers, body
@@ -1,49 +1,72 @@
 ﻿import argparse
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 
 import cv2
 from ultralytics import YOLO
 
 from logic.alerts import decide_alert_action
 from logic.context import get_person_zone, is_person_at_height
+from logic import trace
+from logic.events import mark_events_logged, update_event_state
 from logic.logger import log_violation
-from logic.perception import detect_ppe
+from logic.notify import AlertDispatcher, sink_from_spec
+from logic.perception import associate_persons, class_groups_from_names, run_detector
+from logic.pipeline import violation_evidence
 from logic.rules import evaluate_ppe_rules
 
 
-EVENT_CONFIRM_FRAMES = 5
-EVENT_COOLDOWN_SECONDS = 8
-EVENT_FORGET_FRAMES = 45
-
-
 parser = argparse.ArgumentParser(description="PPE Monitoring System")
 parser.add_argument(
     "--mode",
     type=str,
     default="demo",
-    choices=["demo", "video"],
-    help="Run mode: demo (webcam) or video (file)",
+    choices=["demo", "video", "batch", "replay"],
+    help=(
+        "Run mode: demo (webcam), video (file), batch (headless file or directory) "
+        "or replay (re-run rules and events from cached detections)"
+    ),
 )
 parser.add_argument(
     "--video_path",
     type=str,
     default=None,
-    help="Path to video file (used in video mode)",
+    help="Path to video file (video/replay modes) or file/directory (batch mode)",
 )
+parser.add_argument(
+    "--workers",
+    type=int,
+    default=None,
+    help="Worker processes for batch mode (default: CPU count)",
+)
+parser.add_argument(
+    "--report",
+    type=str,
+    default=None,
+    help="Violations report path for batch/replay modes (default: logs/<mode>_report.csv)",
+)
+parser.add_argument(
+    "--min_conf",
+    type=float,
+    default=None,
+    help="Replay mode: drop cached detections below this confidence",
+)
+parser.add_argument(
+    "--notify",
+    action="append",
+    default=[],
+    metavar="SINK",
+    help="Send alert notifications to a sink (http(s)://..., file:PATH, tcp://host:port, smtp://...)",
+)
+parser.add_argument(
+    "--notify_window",
+    type=float,
+    default=60.0,
+    help="Seconds over which repeat alerts per camera and severity are coalesced",
+)
+trace.add_arguments(parser)
 
-args = parser.parse_args()
-if args.mode == "demo":
-    cap = cv2.VideoCapture(0)
-    camera_id = "CAM_DEMO"
-else:
-    if args.video_path is None:
-        print("Video path not provided")
-        raise SystemExit(1)
-    cap = cv2.VideoCapture(args.video_path)
-    camera_id = "CAM_VIDEO"
-
-model = YOLO("CVBASEDSMS\\CVBASEDSMS\\model\\best.pt")
-print("MODEL CLASSES:", model.names)
+model = None
 
 
 def build_contextual_reason(violation, zone, at_height):
@@ -71,149 +94,193 @@ def process_frame(frame):
     h, w, _ = frame.shape
     all_violations = []
 
-    overlay = frame.copy()
-    cv2.rectangle(overlay, (0, 0), (int(0.6 * w), h), (0, 255, 0), -1)
-    cv2.rectangle(overlay, (int(0.6 * w), 0), (w, h), (0, 0, 255), -1)
-    alpha = 0.15
-    frame = cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0)
-
-    cv2.putText(
-        frame,
-        "SAFE ZONE",
-        (10, 30),
-        cv2.FONT_HERSHEY_SIMPLEX,
-        0.7,
-        (0, 255, 0),
-        2,
-    )
-    cv2.putText(
-        frame,
-        "HIGH RISK ZONE",
-        (int(0.6 * w) + 10, 30),
-        cv2.FONT_HERSHEY_SIMPLEX,
-        0.7,
-        (0, 0, 255),
-        2,
-    )
-
-    persons = detect_ppe(frame, model)
-
-    for person in persons:
-        zone = get_person_zone(person, w)
-        at_height = is_person_at_height(person["bbox"], h)
-        violations = evaluate_ppe_rules(person, zone, at_height)
-        for sev, violation in violations:
-            reason = build_contextual_reason(violation, zone, at_height)
-            event_id = _event_id_for_person_violation(person["bbox"], zone, violation)
-            all_violations.append((sev, violation, reason, event_id))
-
-    alert = decide_alert_action(all_violations)
-
-    for person in persons:
-        x1, y1, x2, y2 = person["bbox"]
-        color = (0, 255, 0)
-        if alert == "WARNING":
-            color = (0, 255, 255)
-        elif alert == "CRITICAL":
-            color = (0, 0, 255)
-        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-
-    if alert != "INFO":
-        reasons = ", ".join([v[1] for v in all_violations])
+    with trace.span("render"):
+        overlay = frame.copy()
+        cv2.rectangle(overlay, (0, 0), (int(0.6 * w), h), (0, 255, 0), -1)
+        cv2.rectangle(overlay, (int(0.6 * w), 0), (w, h), (0, 0, 255), -1)
+        alpha = 0.15
+        frame = cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0)
+
         cv2.putText(
             frame,
-            f"{alert}: {reasons}",
-            (20, 40),
+            "SAFE ZONE",
+            (10, 30),
             cv2.FONT_HERSHEY_SIMPLEX,
-            1,
+            0.7,
+            (0, 255, 0),
+            2,
+        )
+        cv2.putText(
+            frame,
+            "HIGH RISK ZONE",
+            (int(0.6 * w) + 10, 30),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.7,
+            (0, 0, 255),
+            2,
+        )
+
+    with trace.span("detect"):
+        detections = run_detector(frame, model)
+    with trace.span("associate"):
+        persons = associate_persons(detections, class_groups_from_names(model.names))
+
+    with trace.span("rules"):
+        for person in persons:
+            zone = get_person_zone(person, w)
+            at_height = is_person_at_height(person["bbox"], h)
+            violations = evaluate_ppe_rules(person, zone, at_height)
+            for sev, violation in violations:
+                reason = build_contextual_reason(violation, zone, at_height)
+                event_id = _event_id_for_person_violation(person["bbox"], zone, violation)
+                all_violations.append((sev, violation, reason, event_id, person["bbox"], zone))
+
+        alert = decide_alert_action(all_violations)
+        evidence = violation_evidence(persons, w, h)
+
+    with trace.span("render"):
+        for person in persons:
+            x1, y1, x2, y2 = person["bbox"]
+            color = (0, 255, 0)
+            if alert == "WARNING":
+                color = (0, 255, 255)
+            elif alert == "CRITICAL":
+                color = (0, 0, 255)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+
+        if alert != "INFO":
+            reasons = ", ".join([v[1] for v in all_violations])
+            cv2.putText(
+                frame,
+                f"{alert}: {reasons}",
+                (20, 40),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                1,
+                (0, 0, 255),
+                3,
+            )
+
+        cv2.putText(frame, "SAFE", (w - 180, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        cv2.putText(
+            frame,
+            "WARNING",
+            (w - 180, 55),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.6,
+            (0, 255, 255),
+            2,
+        )
+        cv2.putText(
+            frame,
+            "CRITICAL",
+            (w - 180, 80),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.6,
             (0, 0, 255),
-            3,
+            2,
         )
 
-    cv2.putText(frame, "SAFE", (w - 180, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-    cv2.putText(
-        frame,
-        "WARNING",
-        (w - 180, 55),
-        cv2.FONT_HERSHEY_SIMPLEX,
-        0.6,
-        (0, 255, 255),
-        2,
-    )
-    cv2.putText(
-        frame,
-        "CRITICAL",
-        (w - 180, 80),
-        cv2.FONT_HERSHEY_SIMPLEX,
-        0.6,
-        (0, 0, 255),
-        2,
-    )
-
-    return frame, alert, all_violations
+    return frame, alert, all_violations, evidence
 
 
 if __name__ == "__main__":
-    cap = cv2.VideoCapture("CVBASEDSMS\\CVBASEDSMS\\videos\\test.mp4")
+    args = parser.parse_args()
+    if args.mode == "batch":
+        if args.video_path is None:
+            print("Video path not provided")
+            raise SystemExit(1)
+        from logic.batch import run_batch
+
+        raise SystemExit(run_batch(args.video_path, "CAM_BATCH", args.report, args.workers))
+
+    if args.mode == "replay":
+        if args.video_path is None:
+            print("Video path not provided")
+            raise SystemExit(1)
+        from logic.replay import run_replay
+
+        raise SystemExit(
+            run_replay(args.video_path, "CAM_REPLAY", args.report, min_conf=args.min_conf)
+        )
+
+    if args.mode == "demo":
+        cap = cv2.VideoCapture(0)
+        camera_id = "CAM_DEMO"
+    else:
+        if args.video_path is None:
+            print("Video path not provided")
+            raise SystemExit(1)
+        cap = cv2.VideoCapture(args.video_path)
+        camera_id = "CAM_VIDEO"
+
+    trace.enable_from_args(args)
+    model = YOLO("CVBASEDSMS\\CVBASEDSMS\\model\\best.pt")
+    print("MODEL CLASSES:", model.names)
+
+    dispatcher = None
+    if args.notify:
+        dispatcher = AlertDispatcher(
+            [sink_from_spec(spec) for spec in args.notify],
+            window_seconds=args.notify_window,
+        )
+
     event_state = {}
     frame_index = 0
 
     while True:
-        ret, frame = cap.read()
+        trace.profile_tick()
+        with trace.span("read"):
+            ret, frame = cap.read()
         if not ret:
             break
+        # Every frame is processed here, so the frame id is its index.
+        frame_info = (frame_index + 1, time.time())
 
-        frame, alert, all_violations = process_frame(frame)
+        frame, alert, all_violations, evidence = process_frame(frame)
         frame_index += 1
         now = datetime.now()
 
-        current_event_ids = {v[3] for v in all_violations}
-
-        for event_id in current_event_ids:
-            state = event_state.get(
-                event_id, {"count": 0, "last_seen_frame": -1, "last_logged_at": None}
+        with trace.span("events"):
+            events_to_log = update_event_state(
+                event_state, all_violations, frame_index, now, frame_info, evidence
             )
-            if state["last_seen_frame"] == frame_index - 1:
-                state["count"] += 1
-            else:
-                state["count"] = 1
-            state["last_seen_frame"] = frame_index
-            event_state[event_id] = state
-
-        stale_ids = [
-            event_id
-            for event_id, state in event_state.items()
-            if frame_index - state["last_seen_frame"] > EVENT_FORGET_FRAMES
-        ]
-        for event_id in stale_ids:
-            del event_state[event_id]
-
-        events_to_log = []
-        for event_id in current_event_ids:
-            state = event_state[event_id]
-            cooldown_done = (
-                state["last_logged_at"] is None
-                or (now - state["last_logged_at"]) >= timedelta(seconds=EVENT_COOLDOWN_SECONDS)
-            )
-            if state["count"] >= EVENT_CONFIRM_FRAMES and cooldown_done:
-                events_to_log.append(event_id)
 
         if events_to_log:
             violations_to_log = [v for v in all_violations if v[3] in events_to_log]
             if violations_to_log:
-                log_violation(
-                    camera_id=camera_id,
-                    violations=violations_to_log,
-                    severity=alert,
-                )
-                for event_id in events_to_log:
-                    event_state[event_id]["last_logged_at"] = now
+                with trace.span("log"):
+                    log_violation(
+                        camera_id=camera_id,
+                        violations=violations_to_log,
+                        frame_id=frame_info[0],
+                        captured_at=frame_info[1],
+                    )
+                mark_events_logged(event_state, events_to_log, now)
                 print("LOGGED:", alert, [(v[1], v[3]) for v in violations_to_log])
-
-        cv2.imshow("PPE Monitor", frame)
-        if cv2.waitKey(1) & 0xFF == ord("q"):
+                if dispatcher is not None:
+                    for sev, violation, reason, event_id, _bbox, zone in violations_to_log:
+                        dispatcher.submit(
+                            camera_id,
+                            sev,
+                            {
+                                "camera_id": camera_id,
+                                "violation": violation,
+                                "severity": sev,
+                                "reason": reason,
+                                "event_id": event_id,
+                                "zone": zone,
+                                "timestamp": now.isoformat(timespec="seconds"),
+                            },
+                        )
+
+        with trace.span("display"):
+            cv2.imshow("PPE Monitor", frame)
+            key = cv2.waitKey(1) & 0xFF
+        if key == ord("q"):
             break
 
     cap.release()
     cv2.destroyAllWindows()
+    if dispatcher is not None:
+        dispatcher.close()
 
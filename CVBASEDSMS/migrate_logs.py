@@ -0,0 +1,70 @@
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+from logic.history import (
+    concat_frames,
+    is_legacy_csv,
+    list_partitions,
+    normalize_legacy,
+    read_day,
+    to_utc,
+    write_day,
+)
+from logic.logger import LOG_FILE
+
+
+def migrate(legacy_path, keep=False):
+    """
+    Moves the legacy violations.csv, and any day partition still in the
+    old layout, into per-day parquet files in the normalized schema
+    """
+    partitions = list_partitions()
+    legacy = pd.DataFrame()
+    if legacy_path.exists():
+        raw = pd.read_csv(legacy_path, dtype=str)
+        legacy = normalize_legacy(raw)
+        print(f"{legacy_path}: {len(raw)} rows -> {len(legacy)} violation rows")
+
+    days = set(legacy["timestamp"].dt.date) if not legacy.empty else set()
+    days.update(
+        day
+        for day, entry in partitions.items()
+        if any(is_legacy_csv(path) for path in entry["csv"])
+    )
+
+    for day in sorted(days):
+        entry = partitions.get(day, {"csv": [], "parquet": None})
+        frames = [read_day(entry, local=False)]
+        if not legacy.empty:
+            rows = legacy[legacy["timestamp"].dt.date == day]
+            frames.append(rows.assign(timestamp=to_utc(rows["timestamp"])))
+        target = write_day(day, concat_frames(frames))
+        for path in entry["csv"]:
+            path.unlink(missing_ok=True)
+        print(f"{day}: wrote {target.name}")
+
+    if legacy_path.exists() and not keep:
+        retired = legacy_path.with_name(legacy_path.stem + ".legacy.csv")
+        legacy_path.rename(retired)
+        print(f"Legacy log moved to {retired}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Migrate violation logs to the partitioned, one-row-per-violation schema. "
+        "Stop running writers first."
+    )
+    parser.add_argument("--legacy_path", type=str, default=str(LOG_FILE))
+    parser.add_argument(
+        "--keep",
+        action="store_true",
+        help="Leave the legacy CSV in place instead of renaming it",
+    )
+    args = parser.parse_args()
+    migrate(Path(args.legacy_path), keep=args.keep)
+
+
+if __name__ == "__main__":
+    main()
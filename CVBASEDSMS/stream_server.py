@@ -1,38 +1,351 @@
 import argparse
 import json
+import signal
 import threading
 import time
-from datetime import datetime, timedelta
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import traceback
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
 
 import cv2
 
+from logic import history, logger, metrics, trace
+from logic.broadcast import EventBroadcaster, format_sse
+from logic.capture import STATES as CAMERA_STATES
+from logic.cascade import CascadeDetector
+from logic.clips import CLIPS_DIR, ClipRecorder
+from logic.context import get_person_zone
+from logic.control import LatencyController
+from logic.events import mark_events_logged, update_event_state
+from logic.heatmap import HEATMAP_DIR, HeatmapAccumulator
+from logic.latency import CAPTURE_BUCKETS, CaptureLatency
 from logic.logger import log_violation
-from logic.pipeline import process_frame
+from logic.notify import AlertDispatcher, sink_from_spec
+from logic.models import ModelRegistry
+from logic.pipeline import (
+    MODEL_PATH,
+    analyze_frame,
+    get_model,
+    render_frame,
+    set_model,
+    violation_evidence,
+)
+from logic.rules import HIGH_RISK, NO_HARNESS, NO_HELMET
+from logic.stub_detector import StubDetector
+from logic.supervisor import CameraSupervisor
+from logic.violations_api import ViolationsApi
 
 
 BASE_DIR = Path(__file__).resolve().parent
 
-EVENT_CONFIRM_FRAMES = 5
-EVENT_COOLDOWN_SECONDS = 8
-EVENT_FORGET_FRAMES = 45
+FPS_SMOOTHING = 0.1
+DEFAULT_JPEG_QUALITY = 80
+MIN_STREAM_WIDTH = 160
+EVENT_RING_SIZE = 512
+SSE_KEEPALIVE_SECONDS = 15.0
+# A frame loop that has not come round for this long is reported stalled;
+# reads give up after a second, so a healthy loop never gets close.
+PRODUCER_STALL_SECONDS = 5.0
+VIEWER_PAGE = BASE_DIR / "static" / "viewer.html"
+DETECTION_FLAGS = {NO_HELMET: 1, NO_HARNESS: 2}
+NO_FRAME_INFO = (None, None)
+
+STAGE_LATENCY = metrics.histogram(
+    "cvbsms_stage_latency_seconds",
+    "Per-frame latency of each pipeline stage.",
+    ("camera", "stage"),
+)
+FRAME_AGE = metrics.histogram(
+    "cvbsms_frame_age_seconds",
+    "Time between grabbing a live frame and handing it to inference.",
+    ("camera",),
+)
+CAPTURE_LATENCY = metrics.histogram(
+    "cvbsms_capture_latency_seconds",
+    "Time from frame capture to detection, encode, send and log.",
+    ("camera", "stage"),
+    buckets=CAPTURE_BUCKETS,
+)
+FPS_TARGET = metrics.gauge("cvbsms_fps_target", "Configured processing fps.", ("camera",))
+FPS_ACHIEVED = metrics.gauge(
+    "cvbsms_fps_achieved", "Smoothed achieved processing fps.", ("camera",)
+)
+FRAMES_PROCESSED = metrics.counter(
+    "cvbsms_frames_processed_total", "Frames run through the pipeline.", ("camera",)
+)
+FRAMES_DROPPED = metrics.counter(
+    "cvbsms_frames_dropped_total", "Frames lost before processing, by reason.", ("camera", "reason")
+)
+PRODUCER_ERRORS = metrics.counter(
+    "cvbsms_producer_errors_total", "Frames whose processing raised.", ("camera",)
+)
+RTSP_RECONNECTS = metrics.counter(
+    "cvbsms_rtsp_reconnects_total", "Capture reconnects after a lost stream.", ("camera",)
+)
+CAPTURE_RESTARTS = metrics.counter(
+    "cvbsms_capture_restarts_total", "Stuck capture workers replaced.", ("camera",)
+)
+CAMERA_STATE = metrics.gauge(
+    "cvbsms_camera_state", "1 for the camera's current health state.", ("camera", "state")
+)
+VIEWERS = metrics.gauge("cvbsms_stream_viewers", "Connected /stream clients.")
+EVENT_SUBSCRIBERS = metrics.gauge("cvbsms_event_subscribers", "Connected /events clients.")
+DETECTION_SUBSCRIBERS = metrics.gauge(
+    "cvbsms_detection_subscribers", "Connected /detections clients."
+)
+BYTES_SENT = metrics.counter(
+    "cvbsms_stream_bytes_total", "Bytes written to live clients by kind.", ("kind",)
+)
+EVENTS_LOGGED = metrics.counter(
+    "cvbsms_events_logged_total", "Confirmed violation events written to the log.", ("camera",)
+)
+INFERENCE_IMGSZ = metrics.gauge(
+    "cvbsms_inference_imgsz", "Current inference image size.", ("camera",)
+)
+FRAME_STRIDE = metrics.gauge(
+    "cvbsms_frame_stride", "Run inference on every Nth frame.", ("camera",)
+)
+CONTROL_ADJUSTMENTS = metrics.counter(
+    "cvbsms_control_adjustments_total",
+    "Latency controller adjustments.",
+    ("camera", "knob", "direction"),
+)
+CLIPS = metrics.counter(
+    "cvbsms_clips_total", "Evidence clips by outcome.", ("camera", "result")
+)
+NOTIFICATIONS = metrics.counter(
+    "cvbsms_notifications_total",
+    "Alert notifications by sink and outcome (dropped: queue full).",
+    ("sink", "result"),
+)
+CASCADE_CROPS = metrics.counter(
+    "cvbsms_cascade_crops_total", "Person crops sent to the PPE model in cascade mode.", ("camera",)
+)
+API_REQUESTS = metrics.counter(
+    "cvbsms_api_requests_total", "/api/violations responses by status.", ("status",)
+)
+MODEL_SWAPS = metrics.counter(
+    "cvbsms_model_swaps_total",
+    "Model reloads by outcome (swapped, rolled_back, rejected, failed).",
+    ("result",),
+)
+EVENT_STATE_SIZE = metrics.gauge(
+    "cvbsms_event_state_size", "Tracked event ids in the confirmation state.", ("camera",)
+)
+
+
+class StreamVariant:
+    def __init__(self, width, quality, raw=False):
+        self.width = width
+        self.quality = quality
+        self.raw = raw
+        self.lock = threading.Lock()
+        self.subscribers = 0
+        self.seq = 0
+        self.data = None
+        self.info = NO_FRAME_INFO
 
 
 class StreamState:
-    def __init__(self):
+    def __init__(self, camera_id="CAM_STREAM"):
         self.lock = threading.Lock()
+        self.frame_ready = threading.Condition(self.lock)
         self.frame = None
+        self.frame_seq = 0
+        self.analysis = ([], "INFO", [])
+        self.frame_info = NO_FRAME_INFO
+        self.frame_time = None
+        self.detections = None
+        self.detections_seq = 0
+        self.render_lock = threading.Lock()
+        self.rendered = None
+        self.rendered_seq = 0
+        self.rendered_info = NO_FRAME_INFO
+        self.variants = {}
+        self.events = EventBroadcaster(EVENT_RING_SIZE)
         self.alert = "INFO"
         self.updated_at = time.time()
+        self.annotate_latency = STAGE_LATENCY.labels(camera_id, "annotate")
+        self.encode_latency = STAGE_LATENCY.labels(camera_id, "encode")
+        self.encode_failed = FRAMES_DROPPED.labels(camera_id, "encode_failed")
+        self.latency = CaptureLatency(camera_id, CAPTURE_LATENCY)
+        self.producer_at = None
+        self.producer_failing = False
+        self.producer_errors = 0
+        self.producer_last_error = None
+
+    def producer_beat(self):
+        self.producer_at = time.time()
+
+    def producer_ok(self):
+        self.producer_failing = False
+
+    def producer_failed(self, exc):
+        with self.lock:
+            self.producer_failing = True
+            self.producer_errors += 1
+            self.producer_last_error = {"error": repr(exc), "at": time.time()}
+
+    def producer_health(self, alive=True):
+        """
+        Returns the frame loop's state: running, failing (the last frame
+        raised), stalled (no loop for PRODUCER_STALL_SECONDS) or dead
+        """
+        with self.lock:
+            at = self.producer_at
+            age = time.time() - at if at is not None else None
+            if not alive:
+                state = "dead"
+            elif age is not None and age > PRODUCER_STALL_SECONDS:
+                state = "stalled"
+            elif self.producer_failing:
+                state = "failing"
+            else:
+                state = "running"
+            return {
+                "state": state,
+                "loop_age": round(age, 3) if age is not None else None,
+                "errors": self.producer_errors,
+                "last_error": self.producer_last_error,
+            }
+
+    def set_frame(
+        self, frame, persons=(), alert="INFO", all_violations=(), frame_info=NO_FRAME_INFO
+    ):
+        """
+        Publishes a raw frame with its analysis and (frame_id,
+        captured_at). Nothing is drawn here; get_rendered annotates it
+        only if a viewer or the clip recorder asks for it.
+        """
+        with self.lock:
+            self.frame = frame
+            self.analysis = (persons, alert, all_violations)
+            self.frame_info = frame_info
+            self.frame_time = time.time()
+            self.frame_seq += 1
+            self.frame_ready.notify_all()
+
+    def get_rendered(self):
+        """
+        Returns (seq, annotated frame, frame info) for the latest frame,
+        drawing it at most once however many variants need it
+        """
+        with self.lock:
+            frame, seq, analysis, info = self.frame, self.frame_seq, self.analysis, self.frame_info
+        if frame is None:
+            return seq, None, info
+
+        with self.render_lock:
+            if self.rendered_seq == seq:
+                return seq, self.rendered, self.rendered_info
+            started = time.perf_counter()
+            with trace.span("render"):
+                rendered = render_frame(frame, *analysis)
+            self.annotate_latency.observe(time.perf_counter() - started)
+            self.rendered, self.rendered_seq, self.rendered_info = rendered, seq, info
+            return seq, rendered, info
+
+    def wait_frame(self, last_seq, timeout=1.0):
+        with self.lock:
+            if self.frame_seq == last_seq:
+                self.frame_ready.wait(timeout)
+            return self.frame_seq
+
+    def get_detections(self):
+        """
+        Returns (seq, compact JSON) describing the latest frame's analysis,
+        built at most once per frame and only when someone asks. Each
+        person is [x1, y1, x2, y2, helmet, harness, zone, flags] with zone
+        0 safe / 1 high risk and flags 1 = no helmet, 2 = no harness.
+        """
+        with self.lock:
+            if self.detections_seq == self.frame_seq or self.frame is None:
+                return self.detections_seq, self.detections
+            frame, seq, frame_time = self.frame, self.frame_seq, self.frame_time
+            persons, alert, all_violations = self.analysis
+            frame_id, captured_at = self.frame_info
+
+        h, w = frame.shape[:2]
+        flags = {}
+        for _sev, violation, _reason, _event_id, bbox, _zone in all_violations:
+            flags[bbox] = flags.get(bbox, 0) | DETECTION_FLAGS.get(violation, 0)
+        people = []
+        for person in persons:
+            bbox = person["bbox"]
+            people.append(
+                [
+                    *bbox,
+                    int(person["helmet"]),
+                    int(person["harness"]),
+                    int(get_person_zone(person, w) == HIGH_RISK),
+                    flags.get(bbox, 0),
+                ]
+            )
+        message = {"f": seq, "t": round(frame_time, 3), "w": w, "h": h, "a": alert, "p": people}
+        if frame_id is not None:
+            message["i"] = frame_id
+            message["c"] = round(captured_at, 3)
+        message = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        with self.lock:
+            if seq > self.detections_seq:
+                self.detections, self.detections_seq = message, seq
+        return seq, message
+
+    def subscribe(self, width, quality, raw=False):
+        key = (width, quality, raw)
+        with self.lock:
+            variant = self.variants.get(key)
+            if variant is None:
+                variant = StreamVariant(width, quality, raw)
+                self.variants[key] = variant
+            variant.subscribers += 1
+            return variant
 
-    def set_frame(self, data):
+    def unsubscribe(self, variant):
         with self.lock:
-            self.frame = data
+            variant.subscribers -= 1
+            if variant.subscribers <= 0:
+                self.variants.pop((variant.width, variant.quality, variant.raw), None)
 
-    def get_frame(self):
+    def get_encoded(self, variant):
+        """
+        Returns (seq, jpeg bytes, frame info) for the latest frame in this
+        variant. The first subscriber to ask for a new frame renders and
+        encodes it; the rest reuse those bytes.
+        """
         with self.lock:
-            return self.frame
+            seq = self.frame_seq
+
+        with variant.lock:
+            if variant.seq != seq:
+                if variant.raw:
+                    # Raw variants feed clients that draw overlays themselves.
+                    with self.lock:
+                        seq, frame, info = self.frame_seq, self.frame, self.frame_info
+                else:
+                    seq, frame, info = self.get_rendered()
+                if frame is None:
+                    return seq, None, info
+                started = time.perf_counter()
+                image = frame
+                if variant.width is not None and variant.width < frame.shape[1]:
+                    height = max(1, round(frame.shape[0] * variant.width / frame.shape[1]))
+                    image = cv2.resize(frame, (variant.width, height), interpolation=cv2.INTER_AREA)
+                with trace.span("encode", args={"width": variant.width, "q": variant.quality}):
+                    ok, encoded = cv2.imencode(
+                        ".jpg", image, [int(cv2.IMWRITE_JPEG_QUALITY), variant.quality]
+                    )
+                if ok:
+                    variant.data = encoded.tobytes()
+                    variant.seq = seq
+                    variant.info = info
+                    self.latency.observe("encode", info[1])
+                else:
+                    self.encode_failed.inc()
+                self.encode_latency.observe(time.perf_counter() - started)
+            return variant.seq, variant.data, variant.info
 
     def set_alert(self, alert):
         with self.lock:
@@ -41,96 +354,259 @@ class StreamState:
 
     def get_status(self):
         with self.lock:
-            return self.alert, self.updated_at
+            return self.alert, self.updated_at, self.frame_info
 
 
-def frame_producer(source, fps, state, camera_id, mode):
-    if mode == "rtsp":
-        cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG)
-        if not cap.isOpened():
-            raise RuntimeError(f"Unable to open RTSP stream: {source}")
-    else:
-        cap = cv2.VideoCapture(str(source))
-        if not cap.isOpened():
-            raise RuntimeError(f"Unable to open video: {source}")
+def parse_stream_params(query):
+    """
+    Reads w, q, fps and raw from a /stream query string. Width is
+    snapped to a multiple of 32 and quality to a multiple of 5 so similar
+    requests share one variant. raw=1 streams frames without the drawn
+    overlay, for clients that draw /detections themselves.
+    """
+    params = parse_qs(query)
+
+    def _int_param(name):
+        values = params.get(name)
+        if not values:
+            return None
+        return int(values[0])
+
+    width = _int_param("w")
+    quality = _int_param("q")
+    max_fps = _int_param("fps")
+    raw = bool(_int_param("raw"))
+
+    if width is not None:
+        width = max(MIN_STREAM_WIDTH, (width // 32) * 32)
+    if quality is None:
+        quality = DEFAULT_JPEG_QUALITY
+    quality = min(95, max(10, (quality // 5) * 5))
+    if max_fps is not None:
+        max_fps = max(1, max_fps)
+    return width, quality, max_fps, raw
+
+
+def report_camera_health(camera_id, health):
+    for name in CAMERA_STATES:
+        CAMERA_STATE.labels(camera_id, name).set(1 if health["state"] == name else 0)
+
+
+def frame_producer(
+    supervisor,
+    fps,
+    state,
+    camera_id,
+    recorder=None,
+    controller=None,
+    dispatcher=None,
+    detector=None,
+    heatmap=None,
+    registry=None,
+):
+    stage_inference = STAGE_LATENCY.labels(camera_id, "inference")
+    stage_events = STAGE_LATENCY.labels(camera_id, "events")
+    frame_age = FRAME_AGE.labels(camera_id)
+    fps_achieved = FPS_ACHIEVED.labels(camera_id)
+    frames_processed = FRAMES_PROCESSED.labels(camera_id)
+    frames_read_failed = FRAMES_DROPPED.labels(camera_id, "read_failed")
+    producer_errors = PRODUCER_ERRORS.labels(camera_id)
+    events_logged = EVENTS_LOGGED.labels(camera_id)
+    event_state_size = EVENT_STATE_SIZE.labels(camera_id)
+    inference_imgsz = INFERENCE_IMGSZ.labels(camera_id)
+    frame_stride = FRAME_STRIDE.labels(camera_id)
+    cascade_crops = CASCADE_CROPS.labels(camera_id)
+    FPS_TARGET.labels(camera_id).set(fps)
 
     frame_interval = 1.0 / max(fps, 1)
     event_state = {}
     frame_index = 0
+    frames_seen = 0
+    persons = []
+    alert = "INFO"
+    all_violations = []
+
+    # Frames are only rendered and encoded for a variant someone holds.
+    # The recorder shares the default one, so viewers at default settings
+    # reuse its encode; with neither, the loop is detection and rules only.
+    recorder_variant = None
+    if recorder is not None:
+        recorder_variant = state.subscribe(None, DEFAULT_JPEG_QUALITY)
+
+    timings = {}
+    last_start = None
+    last_alert = "INFO"
     while True:
-        start = time.time()
-        ret, frame = cap.read()
-        if not ret:
-            if mode == "file":
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        # One bad frame (a detector, render or controller error) must not
+        # end the thread: log it, count it and go on with the next frame.
+        try:
+            trace.profile_tick()
+            state.producer_beat()
+            if registry is not None:
+                # Hot swaps land here, between frames; event state is kept.
+                model = registry.take_pending()
+                if model is not None:
+                    set_model(model)
+                    if detector is not None:
+                        detector.set_model(model)
+            start = time.time()
+            t0 = time.perf_counter()
+            # Waits at most a second; while the camera is down the loop keeps
+            # spinning here and the supervisor reconnects in the background.
+            with trace.span("read"):
+                ret, frame, age, frame_info = supervisor.read(camera_id)
+            if not ret:
+                frames_read_failed.inc()
                 continue
-            cap.release()
-            time.sleep(1.0)
-            cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG)
-            continue
-
-        frame, alert, all_violations = process_frame(frame)
-        frame_index += 1
-        now = datetime.now()
-
-        current_event_ids = {v[3] for v in all_violations}
-        for event_id in current_event_ids:
-            state_item = event_state.get(
-                event_id, {"count": 0, "last_seen_frame": -1, "last_logged_at": None}
-            )
-            if state_item["last_seen_frame"] == frame_index - 1:
-                state_item["count"] += 1
-            else:
-                state_item["count"] = 1
-            state_item["last_seen_frame"] = frame_index
-            event_state[event_id] = state_item
-
-        stale_ids = [
-            event_id
-            for event_id, state_item in event_state.items()
-            if frame_index - state_item["last_seen_frame"] > EVENT_FORGET_FRAMES
-        ]
-        for event_id in stale_ids:
-            del event_state[event_id]
-
-        events_to_log = []
-        for event_id in current_event_ids:
-            state_item = event_state[event_id]
-            cooldown_done = (
-                state_item["last_logged_at"] is None
-                or (now - state_item["last_logged_at"])
-                >= timedelta(seconds=EVENT_COOLDOWN_SECONDS)
-            )
-            if state_item["count"] >= EVENT_CONFIRM_FRAMES and cooldown_done:
-                events_to_log.append(event_id)
-
-        if events_to_log:
-            violations_to_log = [v for v in all_violations if v[3] in events_to_log]
-            if violations_to_log:
-                log_violation(
-                    camera_id=camera_id,
-                    violations=violations_to_log,
-                    severity=alert,
+            frame_age.observe(age)
+            t1 = time.perf_counter()
+
+            if last_start is not None and t0 > last_start:
+                instant_fps = 1.0 / (t0 - last_start)
+                current = fps_achieved.get() or instant_fps
+                fps_achieved.set(current + FPS_SMOOTHING * (instant_fps - current))
+            last_start = t0
+
+            # With a stride above 1 the frames in between reuse the last
+            # detections and skip event updates; frame_index counts inferred
+            # frames so confirmation streaks stay consecutive.
+            imgsz = None
+            stride = 1
+            if controller is not None:
+                imgsz = controller.imgsz
+                stride = controller.stride
+                inference_imgsz.set(imgsz)
+                frame_stride.set(stride)
+            inferred = frames_seen % stride == 0
+            frames_seen += 1
+            if inferred:
+                persons, alert, all_violations = analyze_frame(
+                    frame, timings, imgsz=imgsz, detector=detector
+                )
+                if detector is not None:
+                    cascade_crops.inc(detector.last_crops)
+                stage_inference.observe(timings["inference"])
+                state.latency.observe("detect", frame_info[1])
+                frame_index += 1
+
+            frames_processed.inc()
+            now = datetime.now()
+            t2 = time.perf_counter()
+
+            events_to_log = []
+            if inferred:
+                with trace.span("events"):
+                    h, w = frame.shape[:2]
+                    events_to_log = update_event_state(
+                        event_state,
+                        all_violations,
+                        frame_index,
+                        now,
+                        frame_info,
+                        evidence=violation_evidence(persons, w, h),
+                    )
+            if events_to_log:
+                violations_to_log = [v for v in all_violations if v[3] in events_to_log]
+                if violations_to_log:
+                    clip_path = None
+                    if recorder is not None:
+                        clip_path = recorder.trigger(events_to_log, now.timestamp())
+                        clip_path = str(clip_path) if clip_path is not None else None
+                    frame_id, captured_at = frame_info
+                    with trace.span("log"):
+                        log_violation(
+                            camera_id=camera_id,
+                            violations=violations_to_log,
+                            clip_path=clip_path,
+                            frame_id=frame_id,
+                            captured_at=captured_at,
+                        )
+                    state.latency.observe("log", captured_at)
+                    onsets = {}
+                    for event_id in events_to_log:
+                        onset = event_state[event_id]["onset"]
+                        if onset is not None:
+                            onsets[event_id] = onset
+                            state.latency.observe("onset_to_log", onset[1])
+                    mark_events_logged(event_state, events_to_log, now)
+                    events_logged.inc(len(violations_to_log))
+                    if heatmap is not None:
+                        h, w = frame.shape[:2]
+                        for v in violations_to_log:
+                            heatmap.add(v[4], w, h, now.timestamp())
+                    for sev, violation, reason, event_id, bbox, zone in violations_to_log:
+                        event = {
+                            "camera_id": camera_id,
+                            "violation": violation,
+                            "severity": sev,
+                            "reason": reason,
+                            "event_id": event_id,
+                            "zone": zone,
+                            "bbox": list(bbox),
+                            "clip": clip_path,
+                            "timestamp": now.isoformat(timespec="seconds"),
+                            "frame_id": frame_id,
+                            "onset_frame_id": onsets.get(event_id, NO_FRAME_INFO)[0],
+                        }
+                        state.events.publish("violation", event)
+                        if dispatcher is not None:
+                            dispatcher.submit(camera_id, sev, event)
+            event_state_size.set(len(event_state))
+            stage_events.observe(time.perf_counter() - t2)
+
+            if alert != last_alert:
+                state.events.publish(
+                    "alert",
+                    {
+                        "camera_id": camera_id,
+                        "alert": alert,
+                        "previous": last_alert,
+                        "timestamp": now.isoformat(timespec="seconds"),
+                    },
                 )
-                for event_id in events_to_log:
-                    event_state[event_id]["last_logged_at"] = now
+                last_alert = alert
+            state.set_alert(alert)
+            state.set_frame(frame, persons, alert, all_violations, frame_info)
+            if recorder is not None:
+                _, data, _ = state.get_encoded(recorder_variant)
+                if data is not None:
+                    recorder.add_frame(now.timestamp(), data)
 
-        state.set_alert(alert)
-        ok, encoded = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-        if ok:
-            state.set_frame(encoded.tobytes())
+            if controller is not None:
+                # From t1: waiting for the camera or file pacing is not cost.
+                controller.observe(time.perf_counter() - t1, inferred)
 
-        elapsed = time.time() - start
-        if elapsed < frame_interval:
-            time.sleep(frame_interval - elapsed)
+            elapsed = time.time() - start
+            if elapsed < frame_interval:
+                time.sleep(frame_interval - elapsed)
+            state.producer_ok()
+        except Exception as exc:
+            producer_errors.inc()
+            state.producer_failed(exc)
+            print(f"[{camera_id}] frame failed: {exc!r}")
+            traceback.print_exc()
+            time.sleep(frame_interval)
 
 
 class StreamHandler(BaseHTTPRequestHandler):
     def do_GET(self):
-        if self.path == "/status":
-            alert, updated_at = self.server.state.get_status()
+        url = urlsplit(self.path)
+        if url.path == "/status":
+            state = self.server.state
+            alert, updated_at, (frame_id, captured_at) = state.get_status()
+            # alert is the last one computed; camera says whether frames
+            # are still arriving to back it, producer whether they are
+            # still being analysed, frame which one it came from.
+            producer = state.producer_health(self.server.producer.is_alive())
             payload = json.dumps(
-                {"alert": alert, "updated_at": updated_at}
+                {
+                    "alert": alert,
+                    "updated_at": updated_at,
+                    "camera": self.server.supervisor.health(self.server.camera_id),
+                    "producer": producer,
+                    "frame": {"id": frame_id, "captured_at": captured_at},
+                    "latency": state.latency.snapshot(),
+                }
             ).encode("utf-8")
             self.send_response(200)
             self.send_header("Content-Type", "application/json")
@@ -141,28 +617,305 @@ class StreamHandler(BaseHTTPRequestHandler):
             self.wfile.write(payload)
             return
 
-        if self.path != "/stream":
+        if url.path == "/control":
+            controller = self.server.controller
+            snapshot = controller.snapshot() if controller is not None else {"adaptive": False}
+            payload = json.dumps(snapshot).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Cache-Control", "no-store")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        if url.path == "/metrics":
+            payload = metrics.REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Cache-Control", "no-store")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        if url.path == "/events":
+            self.stream_events(url)
+            return
+
+        if url.path == "/detections":
+            self.stream_detections(url)
+            return
+
+        if url.path == "/viewer":
+            try:
+                payload = VIEWER_PAGE.read_bytes()
+            except OSError:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        if url.path == "/model":
+            registry = self.server.registry
+            if registry is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_json(200, registry.status())
+            return
+
+        if url.path == "/heatmap":
+            self.send_heatmap(url)
+            return
+
+        if url.path == "/trace":
+            payload = trace.to_json()
+            if payload is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            payload = payload.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Cache-Control", "no-store")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        if url.path == "/api/violations":
+            status, headers, payload = self.server.violations_api.handle(url.query, self.headers)
+            API_REQUESTS.labels(str(status)).inc()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            if status != 304:
+                self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        if url.path != "/stream":
             self.send_response(404)
             self.end_headers()
             return
 
+        try:
+            width, quality, max_fps, raw = parse_stream_params(url.query)
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            return
+
         self.send_response(200)
         self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
         self.end_headers()
 
+        state = self.server.state
+        variant = state.subscribe(width, quality, raw)
+        send_interval = 1.0 / max_fps if max_fps else 0.0
+        VIEWERS.labels().inc()
         try:
+            last_seq = 0
+            next_send = 0.0
             while True:
-                frame = self.server.state.get_frame()
+                if state.wait_frame(last_seq) == last_seq:
+                    continue
+                wait = next_send - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                seq, frame, (frame_id, captured_at) = state.get_encoded(variant)
                 if frame is None:
                     time.sleep(0.05)
                     continue
-                self.wfile.write(b"--frame\r\n")
-                self.wfile.write(b"Content-Type: image/jpeg\r\n\r\n")
-                self.wfile.write(frame)
-                self.wfile.write(b"\r\n")
-                time.sleep(0.02)
+                # Clients compare X-Capture-Time with their own clock for
+                # glass-to-glass latency; gaps in X-Frame-Id are skipped frames.
+                headers = b"Content-Type: image/jpeg\r\n"
+                if frame_id is not None:
+                    headers += b"X-Frame-Id: %d\r\nX-Capture-Time: %.3f\r\n" % (
+                        frame_id,
+                        captured_at,
+                    )
+                with trace.span("http_write", "http", {"bytes": len(frame)}):
+                    self.wfile.write(b"--frame\r\n")
+                    self.wfile.write(headers + b"\r\n")
+                    self.wfile.write(frame)
+                    self.wfile.write(b"\r\n")
+                    self.wfile.flush()
+                state.latency.observe("send", captured_at)
+                BYTES_SENT.labels("mjpeg").inc(len(frame))
+                last_seq = seq
+                next_send = time.monotonic() + send_interval
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        finally:
+            state.unsubscribe(variant)
+            VIEWERS.labels().dec()
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        registry = self.server.registry
+        if registry is None or url.path not in ("/model/reload", "/model/rollback"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        if url.path == "/model/rollback":
+            if not registry.rollback():
+                self.send_json(409, {"error": "no previous model"})
+                return
+            self.send_json(202, registry.status())
+            return
+
+        # Only files under model/ can be loaded, by name or relative path.
+        model_dir = MODEL_PATH.parent.resolve()
+        name = parse_qs(url.query).get("path", [MODEL_PATH.name])[0]
+        path = (model_dir / name).resolve()
+        if not path.is_relative_to(model_dir) or not path.is_file():
+            self.send_json(400, {"error": f"no model file {name} in {model_dir}"})
+            return
+        if not registry.load(path):
+            self.send_json(409, {"error": "a model is already loading"})
+            return
+        self.send_json(202, registry.status())
+
+    def send_json(self, status, data):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_heatmap(self, url):
+        heatmap = self.server.heatmap
+        params = parse_qs(url.query)
+        window = params.get("window", ["day"])[0]
+        fmt = params.get("format", ["json"])[0]
+        if heatmap is None or window not in heatmap.names or fmt not in ("json", "png"):
+            self.send_response(404 if heatmap is None else 400)
+            self.end_headers()
+            return
+        if fmt == "png":
+            try:
+                width = min(1920, max(MIN_STREAM_WIDTH, int(params.get("w", ["640"])[0])))
+            except ValueError:
+                self.send_response(400)
+                self.end_headers()
+                return
+            payload = heatmap.to_png(window, width)
+            content_type = "image/png"
+        else:
+            payload = json.dumps(heatmap.to_json(window)).encode("utf-8")
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def stream_detections(self, url):
+        """
+        SSE feed of the latest frame's detections as compact JSON. Slow
+        clients skip straight to the newest frame instead of queueing, and
+        fps caps the send rate like /stream does.
+        """
+        try:
+            max_fps = int(parse_qs(url.query).get("fps", ["0"])[0])
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            return
+        send_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+
+        state = self.server.state
+        DETECTION_SUBSCRIBERS.labels().inc()
+        try:
+            self.wfile.write(b"retry: 3000\n\n")
+            self.wfile.flush()
+            last_seq = 0
+            next_send = 0.0
+            idle_since = time.monotonic()
+            while True:
+                if state.wait_frame(last_seq) == last_seq:
+                    if time.monotonic() - idle_since >= SSE_KEEPALIVE_SECONDS:
+                        self.wfile.write(b": keepalive\n\n")
+                        self.wfile.flush()
+                        idle_since = time.monotonic()
+                    continue
+                wait = next_send - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                seq, message = state.get_detections()
+                if message is None:
+                    time.sleep(0.05)
+                    continue
+                with trace.span("sse_write", "http", {"bytes": len(message)}):
+                    chunk = b"data: " + message + b"\n\n"
+                    self.wfile.write(chunk)
+                    self.wfile.flush()
+                BYTES_SENT.labels("detections").inc(len(chunk))
+                last_seq = seq
+                next_send = time.monotonic() + send_interval
+                idle_since = time.monotonic()
         except (BrokenPipeError, ConnectionResetError):
             return
+        finally:
+            DETECTION_SUBSCRIBERS.labels().dec()
+
+    def stream_events(self, url):
+        events = self.server.state.events
+        resume = self.headers.get("Last-Event-ID")
+        if not resume:
+            resume = parse_qs(url.query).get("last_event_id", [""])[0]
+        try:
+            last_id = int(resume) if resume else events.last_id()
+        except ValueError:
+            last_id = events.last_id()
+        if last_id > events.last_id():
+            # The id comes from before a server restart; replay what we have.
+            last_id = 0
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+
+        EVENT_SUBSCRIBERS.labels().inc()
+        try:
+            self.wfile.write(b"retry: 3000\n\n")
+            self.wfile.flush()
+            while True:
+                pending = events.wait_since(last_id, SSE_KEEPALIVE_SECONDS)
+                if not pending:
+                    self.wfile.write(b": keepalive\n\n")
+                with trace.span("sse_write", "http"):
+                    for event_id, event_type, data in pending:
+                        self.wfile.write(format_sse(event_id, event_type, data))
+                        last_id = event_id
+                    self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        finally:
+            EVENT_SUBSCRIBERS.labels().dec()
 
 
 def main():
@@ -183,21 +936,244 @@ def main():
     parser.add_argument("--camera_id", type=str, default="CAM_STREAM")
     parser.add_argument("--port", type=int, default=8000)
     parser.add_argument("--fps", type=int, default=12)
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Adapt inference size and frame stride to stay within the latency budget",
+    )
+    parser.add_argument(
+        "--latency_budget_ms",
+        type=float,
+        default=None,
+        help="Per-frame processing budget (default: 1000 / fps)",
+    )
+    parser.add_argument("--min_imgsz", type=int, default=320)
+    parser.add_argument("--max_imgsz", type=int, default=640)
+    parser.add_argument("--max_stride", type=int, default=4)
+    parser.add_argument(
+        "--clip_seconds",
+        type=float,
+        default=5.0,
+        help="Seconds of evidence kept before and after each event (0 disables clips)",
+    )
+    parser.add_argument(
+        "--clip_max_mb",
+        type=float,
+        default=None,
+        help="Memory cap for clip buffers (default: 6 MB per second of pre and post evidence)",
+    )
+    parser.add_argument(
+        "--notify",
+        action="append",
+        default=[],
+        metavar="SINK",
+        help=(
+            "Send alert notifications to a sink; repeatable. One of http(s)://..., "
+            "file:PATH, tcp://host:port, smtp://[user:pass@]host[:port]?from=..&to=.. or memory"
+        ),
+    )
+    parser.add_argument(
+        "--notify_window",
+        type=float,
+        default=60.0,
+        help="Seconds over which repeat alerts per camera and severity are coalesced",
+    )
+    parser.add_argument(
+        "--notify_min_severity", choices=["WARNING", "CRITICAL"], default="WARNING"
+    )
+    parser.add_argument(
+        "--detector",
+        choices=["yolo", "stub"],
+        default="yolo",
+        help="stub replaces the model with a synthetic detector (load tests)",
+    )
+    parser.add_argument("--stub_latency_ms", type=float, default=30.0)
+    parser.add_argument("--stub_mode", choices=["sleep", "cpu"], default="sleep")
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="Find persons first, then run the PPE model only on crops of at-risk persons",
+    )
+    parser.add_argument(
+        "--person_model",
+        type=str,
+        default=None,
+        help="Lighter person detector for --cascade (default: the PPE model)",
+    )
+    parser.add_argument("--person_imgsz", type=int, default=320)
+    parser.add_argument("--crop_imgsz", type=int, default=320)
+    parser.add_argument(
+        "--person_refresh",
+        type=int,
+        default=1,
+        help="Re-detect persons every N inferred frames, reusing boxes in between",
+    )
+    parser.add_argument(
+        "--model_watch",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="Poll model/best.pt this often and hot-swap when it changes (0 disables)",
+    )
+    parser.add_argument(
+        "--log_dir",
+        type=str,
+        default=None,
+        help="Write violation history and clips under this directory instead of logs/",
+    )
+    trace.add_arguments(parser)
     args = parser.parse_args()
+    trace.enable_from_args(args)
+    if args.detector == "stub":
+        set_model(StubDetector(args.stub_latency_ms, mode=args.stub_mode))
+    detector = None
+    if args.cascade:
+        person_model = None
+        if args.person_model:
+            from ultralytics import YOLO
+
+            person_model = YOLO(args.person_model)
+        detector = CascadeDetector(
+            get_model(),
+            person_model=person_model,
+            person_imgsz=args.person_imgsz,
+            crop_imgsz=args.crop_imgsz,
+            person_refresh=args.person_refresh,
+        )
+    clips_dir = None
+    heatmap_dir = HEATMAP_DIR
+    if args.log_dir:
+        log_dir = Path(args.log_dir)
+        logger.LOG_DIR = history.LOG_DIR = log_dir / "history"
+        logger.LOG_FILE = history.LOG_FILE = log_dir / "violations.csv"
+        clips_dir = log_dir / "clips"
+        heatmap_dir = log_dir / "heatmaps"
+    heatmap = HeatmapAccumulator(args.camera_id, out_dir=heatmap_dir)
 
-    state = StreamState()
-    source = args.video_path if args.mode == "file" else args.rtsp_url
+    state = StreamState(args.camera_id)
+    supervisor = CameraSupervisor(
+        on_health=report_camera_health,
+        on_restart=lambda camera_id: CAPTURE_RESTARTS.labels(camera_id).inc(),
+    )
+    reader_options = {
+        "on_drop": FRAMES_DROPPED.labels(args.camera_id, "stale").inc,
+        "on_reconnect": RTSP_RECONNECTS.labels(args.camera_id).inc,
+        # Timed around retrieve() on the reader thread, not the wait in read().
+        "on_decode": STAGE_LATENCY.labels(args.camera_id, "decode").observe,
+    }
+    if args.mode == "file":
+        # Paced to --fps and looped, as the old inline reader did.
+        supervisor.add(
+            args.camera_id,
+            args.video_path,
+            api_preference=cv2.CAP_ANY,
+            realtime_fps=args.fps,
+            loop=True,
+            **reader_options,
+        )
+    else:
+        supervisor.add(args.camera_id, args.rtsp_url, **reader_options)
+    recorder = None
+    if args.clip_seconds > 0:
+        recorder = ClipRecorder(
+            args.camera_id,
+            pre_seconds=args.clip_seconds,
+            post_seconds=args.clip_seconds,
+            max_bytes=int(args.clip_max_mb * 1024 * 1024) if args.clip_max_mb else None,
+            out_dir=clips_dir or CLIPS_DIR,
+            on_written=CLIPS.labels(args.camera_id, "written").inc,
+            on_dropped=CLIPS.labels(args.camera_id, "dropped").inc,
+        )
+    controller = None
+    if args.adaptive:
+        budget_ms = args.latency_budget_ms or 1000.0 / max(args.fps, 1)
+        controller = LatencyController(
+            args.camera_id,
+            budget_ms / 1000.0,
+            min_imgsz=args.min_imgsz,
+            max_imgsz=args.max_imgsz,
+            max_stride=args.max_stride,
+            on_adjust=lambda direction, knob: CONTROL_ADJUSTMENTS.labels(
+                args.camera_id, knob, direction
+            ).inc(),
+        )
+    registry = None
+    if args.detector == "yolo":
+        warmup_imgsz = {640}
+        if controller is not None:
+            # Every size the controller can switch to, so none of them
+            # pays a cold start on its first frame after a swap.
+            warmup_imgsz = set(controller.steps)
+        if args.cascade:
+            warmup_imgsz = {args.person_imgsz, args.crop_imgsz}
+        registry = ModelRegistry(
+            get_model(),
+            MODEL_PATH,
+            warmup_imgsz=sorted(warmup_imgsz),
+            watch_interval=args.model_watch or None,
+            on_result=lambda result: MODEL_SWAPS.labels(result).inc(),
+        )
+    dispatcher = None
+    if args.notify:
+        dispatcher = AlertDispatcher(
+            [sink_from_spec(spec) for spec in args.notify],
+            window_seconds=args.notify_window,
+            min_severity=args.notify_min_severity,
+            on_sent=lambda sink: NOTIFICATIONS.labels(sink, "sent").inc(),
+            on_failed=lambda sink: NOTIFICATIONS.labels(sink, "failed").inc(),
+            on_dropped=NOTIFICATIONS.labels("all", "dropped").inc,
+        )
     thread = threading.Thread(
         target=frame_producer,
-        args=(source, args.fps, state, args.camera_id, args.mode),
+        args=(
+            supervisor,
+            args.fps,
+            state,
+            args.camera_id,
+            recorder,
+            controller,
+            dispatcher,
+            detector,
+            heatmap,
+            registry,
+        ),
         daemon=True,
     )
     thread.start()
 
-    server = HTTPServer(("0.0.0.0", args.port), StreamHandler)
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), StreamHandler)
+    server.daemon_threads = True
     server.state = state
+    server.camera_id = args.camera_id
+    server.supervisor = supervisor
+    server.producer = thread
+    server.controller = controller
+    server.violations_api = ViolationsApi()
+    server.heatmap = heatmap
+    server.registry = registry
     print(f"Streaming on http://localhost:{args.port}/stream")
-    server.serve_forever()
+    # SIGTERM stops the server the same way Ctrl+C does, so the cleanup
+    # below also runs under a service manager. shutdown() must not be
+    # called from the serving thread, hence the helper thread.
+    signal.signal(
+        signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start()
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        supervisor.stop()
+        if registry is not None:
+            registry.stop()
+        if recorder is not None:
+            recorder.close()
+        if dispatcher is not None:
+            # Delivers queued and retrying alerts and joins the worker.
+            dispatcher.close()
+        if heatmap is not None:
+            heatmap.flush()
 
 
 if __name__ == "__main__":
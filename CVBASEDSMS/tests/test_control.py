@@ -0,0 +1,37 @@
+import pytest
+
+from logic.control import LatencyController
+
+BUDGET = 1 / 12
+
+
+def run(controller, inferred_seconds, skipped_seconds=0.0, frames=2000):
+    seen = 0
+    for _ in range(frames):
+        inferred = seen % controller.stride == 0
+        seen += 1
+        controller.observe(inferred_seconds if inferred else skipped_seconds, inferred)
+    return controller.snapshot()["adjustments"]
+
+
+@pytest.mark.parametrize("factor", [1.02, 1.1, 1.19])
+def test_cost_just_over_budget_settles(factor):
+    # A stub detector: the cost does not drop with imgsz, only stride helps.
+    controller = LatencyController("cam", BUDGET)
+    adjustments = run(controller, BUDGET * factor)
+    assert [a["direction"] for a in adjustments] == ["degrade"] * 6
+    assert (controller.imgsz, controller.stride) == (320, 2)
+
+
+def test_cost_well_under_budget_is_left_alone():
+    controller = LatencyController("cam", BUDGET)
+    assert run(controller, BUDGET * 0.7) == []
+    assert (controller.imgsz, controller.stride) == (640, 1)
+
+
+def test_recovers_when_cost_drops():
+    controller = LatencyController("cam", BUDGET)
+    run(controller, BUDGET * 1.5)
+    assert controller.stride == 2
+    run(controller, BUDGET * 0.1)
+    assert (controller.imgsz, controller.stride) == (640, 1)
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from logic.events import EVENT_CONFIRM_FRAMES, update_event_state
+
+EVENT_ID = "NO_HELMET:SAFE:3:5"
+VIOLATION = ("WARNING", "NO_HELMET", "Helmet missing", EVENT_ID, (40, 80, 90, 200), "SAFE")
+
+
+def frames_to_confirm(evidence_per_frame):
+    event_state = {}
+    start = datetime(2026, 10, 19, 8, 0)
+    for frame_index, value in enumerate(evidence_per_frame, start=1):
+        violations = [VIOLATION] if value > 0 else []
+        now = start + timedelta(seconds=frame_index / 15)
+        logged = update_event_state(
+            event_state, violations, frame_index, now, evidence={EVENT_ID: value}
+        )
+        if logged:
+            return frame_index
+    return None
+
+
+@pytest.mark.parametrize("conf", [0.25, 0.3, 0.37])
+def test_steady_low_confidence_violator_is_confirmed(conf):
+    assert frames_to_confirm([conf] * 30) == EVENT_CONFIRM_FRAMES
+
+
+def test_confident_violator_confirms_before_the_frame_rule():
+    assert frames_to_confirm([0.9] * 30) < EVENT_CONFIRM_FRAMES
+
+
+def test_flickering_helmet_is_not_confirmed():
+    assert frames_to_confirm([0.8, -0.7] * 15) is None
@@ -0,0 +1,65 @@
+import csv
+from datetime import datetime
+
+import pytest
+
+from logic import history
+from logic.logger import LOG_HEADER
+from logic.violations_api import build_page, parse_query
+
+
+@pytest.fixture
+def log_dirs(tmp_path, monkeypatch):
+    log_dir = tmp_path / "history"
+    log_dir.mkdir()
+    monkeypatch.setattr(history, "LOG_DIR", log_dir)
+    monkeypatch.setattr(history, "LOG_FILE", tmp_path / "violations.csv")
+    return log_dir, tmp_path / "violations.csv"
+
+
+def write_ties(log_dir, legacy_file):
+    # 3 seconds x 2 cameras x 5 identical rows, plus legacy rows that
+    # share one minute and have no event id.
+    with (log_dir / "violations-2026-10-19.csv").open("w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(LOG_HEADER)
+        for second in range(3):
+            for camera in ("cam1", "cam2"):
+                for _ in range(5):
+                    writer.writerow(
+                        [f"2026-10-19T08:00:0{second}+0000", camera, "NO_HELMET:SAFE:1:1",
+                         "NO_HELMET", "WARNING", "SAFE", 1, 2, 3, 4, "", "", ""]
+                    )
+    with legacy_file.open("w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp", "camera_id", "violations", "severity"])
+        for _ in range(7):
+            writer.writerow(["19-10-2026 07:30", "cam1", "NO_HELMET, NO_HARNESS", "CRITICAL"])
+    return 30 + 14
+
+
+@pytest.mark.parametrize("limit", [1, 4, 7, 1000])
+def test_pages_return_every_tied_row_once(log_dirs, limit):
+    total = write_ties(*log_dirs)
+    seen = []
+    cursor = None
+    for _ in range(total + 1):
+        query = f"limit={limit}" + (f"&cursor={cursor}" if cursor else "")
+        page = build_page(parse_query(query))
+        seen.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == total
+    timestamps = [datetime.fromisoformat(item["timestamp"]) for item in seen]
+    assert all(ts.tzinfo is not None for ts in timestamps)
+    assert timestamps == sorted(timestamps, reverse=True)
+    assert sum(item["event_id"] is None for item in seen) == 14
+
+
+def test_first_page_counts_cover_the_range(log_dirs):
+    total = write_ties(*log_dirs)
+    page = build_page(parse_query("limit=5"))
+    assert page["counts"]["total"] == total
+    assert len(page["items"]) == 5